@@ -40,6 +40,11 @@ class App extends Component {
   }
 
   handleCheckoutModalShow(){
+    // one key per checkout attempt, so resubmitting the form after a network error
+    // can not create a second order
+    this.idempotencyKey = window.crypto && window.crypto.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
     this.setState({checkoutModalActive: true});
   }
 
@@ -69,6 +74,7 @@ class App extends Component {
           'Accept': 'application/json',
           'Content-Type': 'application/json',
           'X-CSRFToken': csrfToken,
+          'Idempotency-Key': this.idempotencyKey,
         },
         body: JSON.stringify(data),
       });
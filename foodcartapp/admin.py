@@ -4,8 +4,10 @@ from django.shortcuts import reverse
 from django.templatetags.static import static
 from django.utils.html import format_html
 
-from .models import (Order, Product, ProductCategory, OrderItem,
+from .images import get_thumbnail_url
+from .models import (Banner, Order, Product, ProductCategory, OrderItem,
                      Restaurant, RestaurantMenuItem)
+from .search import product_search_index
 from geo_location.models import GeoLocation
 
 
@@ -55,10 +57,8 @@ class ProductAdmin(admin.ModelAdmin):
         'category',
     ]
     search_fields = [
-        # FIXME SQLite can not convert letter case for cyrillic words properly,
-        # so search will be buggy.
-        # Migration to PostgreSQL is necessary
         'name',
+        'description',
         'category__name',
     ]
 
@@ -101,7 +101,8 @@ class ProductAdmin(admin.ModelAdmin):
         if not obj.image:
             return 'выберите картинку'
         return format_html(
-            '<img src="{url}" style="max-height: 200px;"/>', url=obj.image.url)
+            '<img src="{url}" style="max-height: 200px;"/>',
+            url=get_thumbnail_url(obj.image, 'medium'))
     get_image_preview.short_description = 'превью'
 
     def get_image_list_preview(self, obj):
@@ -111,15 +112,61 @@ class ProductAdmin(admin.ModelAdmin):
         return format_html(
             '<a href="{edit_url}"><img src="{src}" '
             'style="max-height: 50px;"/></a>',
-            edit_url=edit_url, src=obj.image.url)
+            edit_url=edit_url, src=get_thumbnail_url(obj.image, 'small'))
     get_image_list_preview.short_description = 'превью'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        found_ids = product_search_index.search(search_term)
+        return queryset.filter(pk__in=found_ids), False
+
 
 @admin.register(ProductCategory)
 class ProductCategoryAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        'title',
+        'get_image_list_preview',
+        'position',
+        'starts_at',
+        'ends_at',
+    ]
+    list_editable = [
+        'position',
+    ]
+    fields = [
+        'title',
+        'text',
+        'image',
+        'get_image_preview',
+        'position',
+        'starts_at',
+        'ends_at',
+    ]
+    readonly_fields = [
+        'get_image_preview',
+    ]
+
+    def get_image_preview(self, obj):
+        if not obj.image:
+            return 'выберите картинку'
+        return format_html(
+            '<img src="{url}" style="max-height: 200px;"/>', url=obj.image.url)
+    get_image_preview.short_description = 'превью'
+
+    def get_image_list_preview(self, obj):
+        if not obj.image:
+            return 'нет картинки'
+        return format_html(
+            '<img src="{src}" style="max-height: 50px;"/>', src=obj.image.url)
+    get_image_list_preview.short_description = 'превью'
+
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
@@ -139,6 +186,11 @@ class OrderAdmin(admin.ModelAdmin):
         'address',
         'phonenumber',
         'status',
+        'total',
+    ]
+    readonly_fields = [
+        'total',
+        'items_count',
     ]
     list_filter = ['status']
 
@@ -146,6 +198,10 @@ class OrderAdmin(admin.ModelAdmin):
         OrderItemInline
     ]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.update_totals()
+
     def response_change(self, request, obj):
         if 'back_page' in request.GET:
             return HttpResponseRedirect(request.GET['back_page'])
@@ -159,3 +215,16 @@ class ProductOrderAdmin(admin.ModelAdmin):
         'id',
         'order',
     ]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        obj.order.update_totals()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        obj.order.update_totals()
+
+    def delete_queryset(self, request, queryset):
+        order_ids = set(queryset.values_list('order_id', flat=True))
+        super().delete_queryset(request, queryset)
+        Order.objects.filter(pk__in=order_ids).refresh_totals()
@@ -0,0 +1,43 @@
+"""Async variants of the public API views, for serving under ASGI.
+
+Cache backends of Django 3.2 have no async API, so cache reads run in
+the default thread pool and do not hold the thread that owns DB
+connections. Anything touching the ORM runs in that thread with
+`sync_to_async`.
+"""
+from asgiref.sync import sync_to_async
+
+from . import views
+from .catalog import (find_banners_snapshot, find_catalog_snapshot,
+                      get_banners_snapshot, get_catalog_snapshot)
+
+
+async def read_cache(lookup):
+    return await sync_to_async(lookup, thread_sensitive=False)()
+
+
+async def banners_list_api(request):
+    snapshot = await read_cache(find_banners_snapshot)
+    if snapshot is None:
+        snapshot = await sync_to_async(get_banners_snapshot)()
+    return views.snapshot_response(request, snapshot)
+
+
+async def product_list_api(request):
+    if views.PRODUCT_LIST_PARAMS.intersection(request.GET):
+        return await sync_to_async(views.paginated_product_list_api)(request)
+
+    snapshot = await read_cache(find_catalog_snapshot)
+    if snapshot is None:
+        snapshot = await sync_to_async(get_catalog_snapshot)()
+    return views.snapshot_response(request, snapshot)
+
+
+async def register_order(request):
+    # The body is already read by the ASGI handler, so a slow client does
+    # not hold a DB thread. Validation and saving stay in one transaction.
+    return await sync_to_async(views.register_order)(request)
+
+
+# csrf_exempt of Django 3.2 can not wrap coroutines.
+register_order.csrf_exempt = True
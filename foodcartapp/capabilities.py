@@ -0,0 +1,107 @@
+from .catalog import CatalogIndex
+from .models import Restaurant, RestaurantMenuItem
+
+
+class CapabilityIndex(CatalogIndex):
+    """Restaurants that can cook each product, as bitmasks.
+
+    Every restaurant owns a bit, and a product maps to the mask of the
+    restaurants where it is available. Restaurants able to cook a whole
+    order are found with one AND per ordered product.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.restaurant_ids = []
+        self.restaurant_bits = {}
+        self.product_masks = {}
+        self.menu_items = {}
+
+    def rebuild(self):
+        restaurant_ids = sorted(
+            Restaurant.objects.values_list('id', flat=True))
+        restaurant_bits = {
+            restaurant_id: 1 << position
+            for position, restaurant_id in enumerate(restaurant_ids)
+        }
+        available_items = (
+            RestaurantMenuItem.objects
+            .filter(availability=True)
+            .values_list('id', 'restaurant_id', 'product_id')
+        )
+        product_masks = {}
+        menu_items = {}
+        for item_id, restaurant_id, product_id in available_items:
+            product_masks[product_id] = (
+                product_masks.get(product_id, 0)
+                | restaurant_bits[restaurant_id]
+            )
+            menu_items[item_id] = (restaurant_id, product_id)
+
+        self.restaurant_ids = restaurant_ids
+        self.restaurant_bits = restaurant_bits
+        self.product_masks = product_masks
+        self.menu_items = menu_items
+
+    def add_restaurant(self, restaurant_id):
+        if restaurant_id not in self.restaurant_bits:
+            self.restaurant_bits[restaurant_id] = 1 << len(self.restaurant_ids)
+            self.restaurant_ids.append(restaurant_id)
+
+    def update(self, sender, pk, instance, deleted):
+        if sender is Restaurant:
+            if not deleted:
+                self.add_restaurant(pk)
+            elif pk in self.restaurant_bits:
+                # The bit stays reserved until the next rebuild.
+                bit = self.restaurant_bits.pop(pk)
+                for product_id, mask in self.product_masks.items():
+                    self.product_masks[product_id] = mask & ~bit
+        elif sender is RestaurantMenuItem:
+            # As in MenuIndex, the item may have been moved to another
+            # restaurant or product.
+            if pk in self.menu_items:
+                restaurant_id, product_id = self.menu_items.pop(pk)
+                bit = self.restaurant_bits.get(restaurant_id, 0)
+                mask = self.product_masks.get(product_id, 0) & ~bit
+                self.product_masks[product_id] = mask
+            if not deleted and instance.availability:
+                restaurant_id = instance.restaurant_id
+                product_id = instance.product_id
+                self.add_restaurant(restaurant_id)
+                self.menu_items[pk] = (restaurant_id, product_id)
+                self.product_masks[product_id] = (
+                    self.product_masks.get(product_id, 0)
+                    | self.restaurant_bits[restaurant_id]
+                )
+
+    def get_mask(self, product_ids):
+        mask = -1
+        for product_id in product_ids:
+            mask &= self.product_masks.get(product_id, 0)
+            if not mask:
+                break
+        return mask if product_ids else 0
+
+    def get_restaurant_ids(self, mask):
+        restaurant_ids = []
+        while mask:
+            bit = mask & -mask
+            restaurant_ids.append(self.restaurant_ids[bit.bit_length() - 1])
+            mask ^= bit
+        return restaurant_ids
+
+    def match(self, product_ids):
+        """Return ids of restaurants where all the products are available."""
+        return self.match_many([product_ids])[0]
+
+    def match_many(self, orders_product_ids):
+        self.ensure_fresh()
+        with self.lock:
+            return [
+                self.get_restaurant_ids(self.get_mask(product_ids))
+                for product_ids in orders_product_ids
+            ]
+
+
+capability_index = CapabilityIndex()
@@ -0,0 +1,344 @@
+import gzip
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.http import quote_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from .images import get_image_variants, get_srcsets, get_thumbnail_urls
+from .models import (Banner, CacheVersion, Product, ProductCategory,
+                     Restaurant, RestaurantMenuItem)
+from .signals import menu_items_bulk_changed
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+BANNERS_VERSION_KEY = 'banners:version'
+
+# Encoded payload in every available content coding, see make_snapshot
+Snapshot = namedtuple('Snapshot', ['bodies', 'etags', 'last_modified'])
+
+
+def get_version(key):
+    """Return the version of cached data, kept in the cache and in the DB.
+
+    The DB copy survives cache evictions and restarts, so losing the cache
+    key does not invalidate everything cached under the version. Data that
+    has never changed has version 0.
+    """
+    version = cache.get(key)
+    if version is None:
+        stored_version, created = CacheVersion.objects.get_or_create(
+            key=key, defaults={'version': 0})
+        version = stored_version.version
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def advance_version(key):
+    """Bump the version, return (previous_version, version).
+
+    The version is the time of the last change in nanoseconds. It is
+    moved on by a single UPDATE, so concurrent bumps are serialized by the
+    row lock and each of them learns the version it replaced.
+    """
+    with transaction.atomic():
+        CacheVersion.objects.get_or_create(key=key, defaults={'version': 0})
+        CacheVersion.objects.filter(key=key).update(
+            previous_version=F('version'),
+            version=Greatest(F('version') + 1, Value(time.time_ns())),
+        )
+        stored_version = CacheVersion.objects.get(key=key)
+        # Still under the row lock, so the cache never goes back to an
+        # older version.
+        cache.set(key, stored_version.version, timeout=None)
+    return stored_version.previous_version, stored_version.version
+
+
+def bump_version(key):
+    return advance_version(key)[1]
+
+
+def get_modified_at(version):
+    """Return the time of the change that made the version, or None."""
+    return version // 10**9 or None
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def serialize_category(product):
+    if not product.category:
+        return None
+    return {
+        'id': product.category.id,
+        'name': product.category.name,
+    }
+
+
+PRODUCT_FIELD_SERIALIZERS = {
+    'id': lambda product: product.id,
+    'name': lambda product: product.name,
+    'price': lambda product: product.price,
+    'special_status': lambda product: product.special_status,
+    'description': lambda product: product.description,
+    'category': serialize_category,
+    'image': lambda product: product.image.url,
+    'thumbnails': lambda product: get_thumbnail_urls(product.image),
+    'image_variants': lambda product: get_image_variants(product.image),
+    'srcset': lambda product: get_srcsets(get_image_variants(product.image)),
+}
+
+# Model fields each API field is read from, for QuerySet.only()
+PRODUCT_FIELD_SOURCES = {
+    'id': ['id'],
+    'name': ['name'],
+    'price': ['price'],
+    'special_status': ['special_status'],
+    'description': ['description'],
+    'category': ['category', 'category__name'],
+    'image': ['image'],
+    'thumbnails': ['image'],
+    'image_variants': ['image'],
+    'srcset': ['image'],
+}
+
+
+def serialize_product(product, fields=PRODUCT_FIELD_SERIALIZERS):
+    return {
+        field: PRODUCT_FIELD_SERIALIZERS[field](product)
+        for field in fields
+    }
+
+
+def get_json_dumps_params():
+    if settings.DEBUG:
+        return {'ensure_ascii': False, 'indent': 4}
+    return {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def make_snapshot(data, last_modified=None):
+    body = json.dumps(
+        data,
+        cls=DjangoJSONEncoder,
+        **get_json_dumps_params(),
+    ).encode()
+    bodies = {
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+    }
+    if brotli:
+        bodies['br'] = brotli.compress(body, mode=brotli.MODE_TEXT)
+
+    digest = hashlib.sha1(body).hexdigest()
+    # Each coding is a separate representation with its own strong ETag.
+    etags = {
+        encoding: quote_etag(
+            digest if encoding == 'identity' else f'{digest}-{encoding}')
+        for encoding in bodies
+    }
+    return Snapshot(bodies, etags, last_modified)
+
+
+def get_catalog_products(version=None):
+    version = version or get_catalog_version()
+    key = f'catalog:products:{version}'
+    dumped_products = cache.get(key)
+    if dumped_products is None:
+        products = Product.objects.select_related('category').available()
+        dumped_products = {
+            product.id: serialize_product(product)
+            for product in products
+        }
+        cache.set(key, dumped_products, settings.CATALOG_CACHE_TIMEOUT)
+    return dumped_products
+
+
+def get_price_table(version=None):
+    version = version or get_catalog_version()
+    key = f'catalog:prices:{version}'
+    prices = cache.get(key)
+    if prices is None:
+        prices = dict(Product.objects.available().values_list('id', 'price'))
+        cache.set(key, prices, settings.CATALOG_CACHE_TIMEOUT)
+    return prices
+
+
+def find_catalog_snapshot():
+    """Return the cached catalog snapshot or None, without touching the DB."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        return None
+    return cache.get(f'catalog:snapshot:{version}')
+
+
+def get_catalog_snapshot():
+    version = get_catalog_version()
+    key = f'catalog:snapshot:{version}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        dumped_products = get_catalog_products(version)
+        snapshot = make_snapshot(
+            list(dumped_products.values()),
+            last_modified=get_modified_at(version),
+        )
+        cache.set(key, snapshot, settings.CATALOG_CACHE_TIMEOUT)
+    return snapshot
+
+
+class CatalogIndex:
+    """In-memory index of catalog data, local to the process.
+
+    The index is rebuilt whenever the catalog version moves on without it,
+    e.g. after a change made by another process. Changes committed in this
+    process are applied incrementally with `update`.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.lock = threading.RLock()
+        catalog_indexes.append(self)
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def update(self, sender, pk, instance, deleted):
+        pass
+
+    def ensure_fresh(self):
+        version = get_catalog_version()
+        with self.lock:
+            if self.version != version:
+                self.rebuild()
+                self.version = version
+
+    def apply_change(self, previous_version, version, change):
+        with self.lock:
+            if self.version is None or self.version != previous_version:
+                return
+            self.update(*change)
+            self.version = version
+
+
+catalog_indexes = []
+
+
+def serialize_banner(banner):
+    return {
+        'title': banner.title,
+        'src': banner.image.url,
+        'text': banner.text,
+    }
+
+
+def build_banners_snapshot(version, now):
+    banners = list(Banner.objects.all())
+    active_banners = [banner for banner in banners if banner.is_active(now)]
+
+    window_bounds = [
+        bound
+        for banner in banners
+        for bound in (banner.starts_at, banner.ends_at)
+        if bound is not None
+    ]
+    passed_bounds = [bound for bound in window_bounds if bound <= now]
+    future_bounds = [bound for bound in window_bounds if bound > now]
+
+    last_modified = get_modified_at(version)
+    if passed_bounds:
+        last_modified = max(
+            last_modified or 0, int(max(passed_bounds).timestamp()))
+
+    timeout = settings.CATALOG_CACHE_TIMEOUT
+    if future_bounds:
+        # Expire the snapshot exactly when the next active window opens
+        # or closes, so the list of active banners is never stale.
+        seconds_left = (min(future_bounds) - now).total_seconds()
+        timeout = min(timeout, max(math.ceil(seconds_left), 1))
+
+    snapshot = make_snapshot(
+        [serialize_banner(banner) for banner in active_banners],
+        last_modified=last_modified,
+    )
+    return snapshot, timeout
+
+
+def find_banners_snapshot():
+    version = cache.get(BANNERS_VERSION_KEY)
+    if version is None:
+        return None
+    return cache.get(f'banners:snapshot:{version}')
+
+
+def get_banners_snapshot():
+    version = get_version(BANNERS_VERSION_KEY)
+    key = f'banners:snapshot:{version}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot, timeout = build_banners_snapshot(version, timezone.now())
+        cache.set(key, snapshot, timeout)
+    return snapshot
+
+
+def catalog_changed(sender, instance, deleted):
+    change = (sender, instance.pk, instance, deleted)
+
+    def commit_change():
+        # A change made meanwhile by another process leaves indexes behind
+        # previous_version, and they are rebuilt on next use.
+        previous_version, version = advance_version(CATALOG_VERSION_KEY)
+        for index in catalog_indexes:
+            index.apply_change(previous_version, version, change)
+
+    # The version is bumped after commit, otherwise a concurrent request
+    # could cache the old catalog under the new version.
+    transaction.on_commit(commit_change)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_save, sender=RestaurantMenuItem)
+def catalog_item_saved(sender, instance, **kwargs):
+    catalog_changed(sender, instance, deleted=False)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def catalog_item_deleted(sender, instance, **kwargs):
+    catalog_changed(sender, instance, deleted=True)
+
+
+@receiver(menu_items_bulk_changed)
+def catalog_bulk_changed(sender, **kwargs):
+    # Indexes can not follow bulk changes and are rebuilt on next use.
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Banner)
+def banners_changed(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(BANNERS_VERSION_KEY))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    # Catalog versions, snapshots and throttling state must be shared
+    # by all processes, otherwise each of them serves its own catalog.
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or not backend.endswith('LocMemCache'):
+        return []
+    return [Error(
+        'Кэш в памяти процесса не подходит для prod-версии.',
+        hint='Укажите общий кэш в CACHE_URL, например pymemcache://.',
+        id='foodcartapp.E001',
+    )]
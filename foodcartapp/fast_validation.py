@@ -0,0 +1,197 @@
+"""Order payload validation without building a DRF serializer per request.
+
+`validate_order` accepts and rejects the same payloads as OrderSerializer
+and raises ValidationError with the same error structure and messages.
+Field rules and messages are taken once from OrderSerializer fields.
+"""
+import re
+from functools import lru_cache
+
+from django.utils.translation import gettext_lazy as _
+from phonenumber_field.phonenumber import PhoneNumber, to_python
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import IntegerField
+from rest_framework.serializers import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
+
+from .catalog import get_price_table
+from .serializers import OrderSerializer
+
+
+NON_FIELD_ERRORS_KEY = api_settings.NON_FIELD_ERRORS_KEY
+PHONENUMBER_SEPARATORS_RE = re.compile(r'[\s\-()]')
+INVALID_PHONENUMBER_MESSAGE = _('The phone number entered is not valid.')
+
+
+class FieldError(Exception):
+    def __init__(self, messages):
+        self.messages = messages
+
+
+class StringRule:
+    def __init__(self, field):
+        self.max_length = field.max_length
+        self.messages = field.error_messages
+
+    def __call__(self, value):
+        if value is None:
+            raise FieldError([self.messages['null']])
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise FieldError([self.messages['invalid']])
+        value = str(value).strip()
+        if not value:
+            raise FieldError([self.messages['blank']])
+
+        errors = []
+        if len(value) > self.max_length:
+            errors.append(
+                self.messages['max_length'].format(max_length=self.max_length))
+        if '\x00' in value:
+            errors.append(_('Null characters are not allowed.'))
+        if errors:
+            raise FieldError(errors)
+        return value
+
+
+class PhoneNumberRule(StringRule):
+    def __call__(self, value):
+        value = super().__call__(value)
+        phonenumber = parse_phonenumber(
+            PHONENUMBER_SEPARATORS_RE.sub('', value))
+        if phonenumber is None:
+            raise FieldError([INVALID_PHONENUMBER_MESSAGE])
+        return phonenumber
+
+
+class IntegerRule:
+    def __init__(self, field):
+        self.min_value = field.min_value
+        self.messages = field.error_messages
+
+    def __call__(self, value):
+        if value is None:
+            raise FieldError([self.messages['null']])
+        max_string_length = IntegerField.MAX_STRING_LENGTH
+        if isinstance(value, str) and len(value) > max_string_length:
+            raise FieldError([self.messages['max_string_length']])
+        try:
+            value = int(IntegerField.re_decimal.sub('', str(value)))
+        except (ValueError, TypeError):
+            raise FieldError([self.messages['invalid']])
+        if self.min_value is not None and value < self.min_value:
+            raise FieldError([
+                self.messages['min_value'].format(min_value=self.min_value)])
+        return value
+
+
+@lru_cache(maxsize=10000)
+def parse_phonenumber(normalized_value):
+    phonenumber = to_python(normalized_value)
+    # Separators alone leave an empty string, which is not a PhoneNumber.
+    if not isinstance(phonenumber, PhoneNumber) or not phonenumber.is_valid():
+        return None
+    return str(phonenumber)
+
+
+def validate_fields(data, rules, required_message):
+    values, errors = {}, {}
+    for name, (source, rule) in rules.items():
+        if name not in data:
+            errors[name] = [required_message]
+            continue
+        try:
+            values[source] = rule(data[name])
+        except FieldError as error:
+            errors[name] = error.messages
+    return values, errors
+
+
+class OrderValidator:
+    def __init__(self):
+        fields = OrderSerializer().fields
+        products_field = fields['products']
+        item_fields = products_field.child.fields
+
+        self.required_message = fields['firstname'].error_messages['required']
+        self.order_rules = {
+            'firstname': ('firstname', StringRule(fields['firstname'])),
+            'lastname': ('lastname', StringRule(fields['lastname'])),
+            'address': ('address', StringRule(fields['address'])),
+            'phonenumber': (
+                'phonenumber', PhoneNumberRule(fields['phonenumber'])),
+        }
+        self.item_rules = {
+            'product': ('product_id', IntegerRule(item_fields['product'])),
+            'quantity': ('quantity', IntegerRule(item_fields['quantity'])),
+        }
+        self.products_messages = products_field.error_messages
+        self.item_messages = products_field.child.error_messages
+        self.does_not_exist_message = \
+            PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+
+    def validate_products(self, products):
+        if products is None:
+            raise FieldError([self.products_messages['null']])
+        if not isinstance(products, list):
+            raise FieldError({NON_FIELD_ERRORS_KEY: [
+                self.products_messages['not_a_list'].format(
+                    input_type=type(products).__name__)]})
+        if not products:
+            raise FieldError({NON_FIELD_ERRORS_KEY: [
+                self.products_messages['empty']]})
+
+        items, errors = [], []
+        for item in products:
+            if not isinstance(item, dict):
+                errors.append({NON_FIELD_ERRORS_KEY: [
+                    self.item_messages['invalid'].format(
+                        datatype=type(item).__name__)]})
+                continue
+            values, item_errors = validate_fields(
+                item, self.item_rules, self.required_message)
+            items.append(values)
+            errors.append(item_errors)
+        if any(errors):
+            raise FieldError(errors)
+
+        prices = get_price_table()
+        for fields, item_errors in zip(items, errors):
+            product_id = fields['product_id']
+            if product_id in prices:
+                fields['price'] = prices[product_id]
+            else:
+                item_errors['product'] = [
+                    self.does_not_exist_message.format(pk_value=product_id)]
+        if any(errors):
+            raise FieldError(errors)
+        return items
+
+    def __call__(self, data):
+        if not isinstance(data, dict):
+            raise ValidationError({NON_FIELD_ERRORS_KEY: [
+                self.item_messages['invalid'].format(
+                    datatype=type(data).__name__)]})
+
+        order_data, errors = validate_fields(
+            data, self.order_rules, self.required_message)
+        if 'products' not in data:
+            errors['products'] = [self.required_message]
+        else:
+            try:
+                order_data['products'] = \
+                    self.validate_products(data['products'])
+            except FieldError as error:
+                errors['products'] = error.messages
+
+        if errors:
+            raise ValidationError(errors)
+        return order_data
+
+
+@lru_cache(maxsize=None)
+def get_order_validator():
+    return OrderValidator()
+
+
+def validate_order(data):
+    return get_order_validator()(data)
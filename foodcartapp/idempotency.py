@@ -0,0 +1,139 @@
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+STORED_KEY_CACHE_KEY = 'idempotency:stored:{digest}'
+
+
+def get_stored_key_cache_key(key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return STORED_KEY_CACHE_KEY.format(digest=digest)
+
+
+def is_response_stored(key):
+    """Tell without a DB query if a response for the key is stored.
+
+    The answer comes from the cache, so a stored response may be missed.
+    """
+    return bool(cache.get(get_stored_key_cache_key(key)))
+
+
+def get_request_hash(request):
+    sha256 = hashlib.sha256()
+    for part in (request.method, request.get_full_path()):
+        sha256.update(part.encode())
+        sha256.update(b'\n')
+    sha256.update(request.body)
+    return sha256.hexdigest()
+
+
+def find_stored_response(key, request_hash):
+    stored = (
+        IdempotencyKey.objects
+        .filter(key=key, expires_at__gt=timezone.now())
+        .first()
+    )
+    if not stored:
+        return None
+    if stored.request_hash != request_hash:
+        # Replaying would hand out the response to another request.
+        return JsonResponse({'detail': (
+            'Idempotency-Key уже использован для другого запроса.'
+        )}, status=422, json_dumps_params={'ensure_ascii': False})
+    response = HttpResponse(
+        stored.response_body,
+        status=stored.response_status,
+        content_type=stored.content_type,
+    )
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def reserve_key(key, request_hash):
+    """Claim the key before the view runs.
+
+    A concurrent request with the same key waits on the unique index and
+    fails once this transaction commits, so the view never runs twice.
+    The view may have side effects outside the database, such as the
+    order journal, which a rollback would not undo.
+    """
+    now = timezone.now()
+    # An expired key may still be there if it was not purged yet
+    IdempotencyKey.objects.filter(key=key, expires_at__lte=now).delete()
+    return IdempotencyKey.objects.create(
+        key=key,
+        request_hash=request_hash,
+        response_status=0,
+        response_body='',
+        content_type='',
+        created_at=now,
+        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+    )
+
+
+def store_response(stored, response):
+    stored.response_status = response.status_code
+    stored.response_body = response.content.decode()
+    stored.content_type = response['Content-Type']
+    stored.save(update_fields=[
+        'response_status', 'response_body', 'content_type'])
+    transaction.on_commit(lambda: cache.set(
+        get_stored_key_cache_key(stored.key),
+        True,
+        settings.IDEMPOTENCY_KEY_TTL,
+    ))
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated Idempotency-Key header.
+
+    Only successful responses are stored, in the same transaction as
+    the changes made by the view. A key reused for a request with another
+    method, path or body gets 422.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return JsonResponse({'detail': (
+                f'Idempotency-Key не длиннее {IDEMPOTENCY_KEY_MAX_LENGTH} '
+                'символов.'
+            )}, status=400, json_dumps_params={'ensure_ascii': False})
+
+        request_hash = get_request_hash(request)
+        stored_response = find_stored_response(key, request_hash)
+        if stored_response:
+            return stored_response
+
+        try:
+            with transaction.atomic():
+                stored = reserve_key(key, request_hash)
+                response = view(request, *args, **kwargs)
+                if isinstance(response, Response):
+                    response.render()
+                if 200 <= response.status_code < 300:
+                    store_response(stored, response)
+                else:
+                    stored.delete()
+        except IntegrityError:
+            # The same key was claimed by a concurrent request meanwhile.
+            stored_response = find_stored_response(key, request_hash)
+            if stored_response:
+                return stored_response
+            raise
+        return response
+
+    return wrapper
@@ -0,0 +1,154 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image
+
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+
+def get_thumbnail_name(name, size_name):
+    root, extension = os.path.splitext(name)
+    return f'{root}.{size_name}{extension}'
+
+
+def create_thumbnail(image_field, size_name, force=False):
+    storage = image_field.storage
+    thumbnail_name = get_thumbnail_name(image_field.name, size_name)
+    if storage.exists(thumbnail_name):
+        if not force:
+            return thumbnail_name
+        storage.delete(thumbnail_name)
+
+    with storage.open(image_field.name) as source:
+        image = Image.open(source)
+        image_format = image.format or 'JPEG'
+        # thumbnail() does not read images that already fit the size.
+        image.load()
+        image.thumbnail(settings.THUMBNAIL_SIZES[size_name])
+
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    content = BytesIO()
+    image.save(content, format=image_format)
+    return storage.save(thumbnail_name, ContentFile(content.getvalue()))
+
+
+def get_thumbnail_url(image_field, size_name):
+    if not image_field:
+        return None
+
+    key = f'thumbnail:{size_name}:{image_field.name}'
+    url = cache.get(key)
+    if url is None:
+        try:
+            thumbnail_name = create_thumbnail(image_field, size_name)
+        except OSError:
+            # Broken or missing uploads are shown as is.
+            return image_field.url
+        url = image_field.storage.url(thumbnail_name)
+        cache.set(key, url, settings.CATALOG_CACHE_TIMEOUT)
+    return url
+
+
+def get_thumbnail_urls(image_field):
+    return {
+        size_name: get_thumbnail_url(image_field, size_name)
+        for size_name in settings.THUMBNAIL_SIZES
+    }
+
+
+def get_supported_formats():
+    Image.init()
+    return [
+        image_format
+        for image_format in settings.IMAGE_VARIANT_FORMATS
+        if image_format.upper() in Image.SAVE
+    ]
+
+
+def get_image_hash(image_field):
+    key = f'image_hash:{image_field.name}'
+    image_hash = cache.get(key)
+    if image_hash is None:
+        sha256 = hashlib.sha256()
+        with image_field.storage.open(image_field.name) as source:
+            for chunk in source.chunks():
+                sha256.update(chunk)
+        image_hash = sha256.hexdigest()
+        cache.set(key, image_hash, settings.CATALOG_CACHE_TIMEOUT)
+    return image_hash
+
+
+def encode_variant(image, width, image_format):
+    height = round(image.height * width / image.width)
+    variant = image.resize((width, height), Image.LANCZOS)
+    if image_format.upper() == 'JPEG' and variant.mode not in ('RGB', 'L'):
+        variant = variant.convert('RGB')
+    content = BytesIO()
+    variant.save(
+        content,
+        format=image_format.upper(),
+        quality=settings.IMAGE_VARIANT_QUALITY,
+    )
+    return content.getvalue()
+
+
+def create_image_variants(image_field, image_hash):
+    storage = image_field.storage
+    with storage.open(image_field.name) as source:
+        image = Image.open(source)
+        image.load()
+
+    widths = sorted({
+        min(width, image.width)
+        for width in settings.IMAGE_VARIANT_WIDTHS
+    })
+    variants = []
+    for image_format in get_supported_formats():
+        for width in widths:
+            name = f'variants/{image_hash}/{width}.{image_format}'
+            if not storage.exists(name):
+                content = encode_variant(image, width, image_format)
+                name = storage.save(name, ContentFile(content))
+            variants.append({
+                'url': storage.url(name),
+                'width': width,
+                'type': Image.MIME.get(
+                    image_format.upper(), f'image/{image_format}'),
+            })
+    return variants
+
+
+def get_image_variants(image_field):
+    if not image_field:
+        return []
+
+    try:
+        image_hash = get_image_hash(image_field)
+        # Variants are shared by all uploads of the same picture.
+        key = f'image_variants:{image_hash}'
+        variants = cache.get(key)
+        if variants is None:
+            variants = create_image_variants(image_field, image_hash)
+            cache.set(key, variants, settings.CATALOG_CACHE_TIMEOUT)
+    except OSError:
+        return []
+    return variants
+
+
+def get_srcsets(variants):
+    srcsets = {}
+    for variant in variants:
+        srcsets.setdefault(variant['type'], []).append(
+            f'{variant["url"]} {variant["width"]}w')
+    return {
+        image_type: ', '.join(sources)
+        for image_type, sources in srcsets.items()
+    }
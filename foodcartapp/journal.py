@@ -0,0 +1,242 @@
+"""Write-ahead journal of accepted orders.
+
+Orders are appended to a local file as length-prefixed records:
+
+    4 bytes  payload length, big endian
+    4 bytes  CRC32 of the payload
+    payload  order as JSON
+
+The drainer commits records to the database in large transactions and
+keeps the offset of the last committed record in `<journal>.offset`.
+Orders carry their journal id in `Order.intake_id`, so records replayed
+after a crash are not saved twice. Records the database refuses, e.g.
+orders of a product deleted after they were accepted, are set aside to
+`<journal>.rejected`, one JSON line each.
+"""
+import fcntl
+import json
+import os
+import struct
+import uuid
+import zlib
+from decimal import Decimal
+
+from django.db import DataError, IntegrityError, transaction
+
+from .models import Order
+from .serializers import create_orders
+
+
+HEADER = struct.Struct('>II')
+
+
+def serialize_order(intake_id, validated_data):
+    return {
+        'intake_id': str(intake_id),
+        'firstname': validated_data['firstname'],
+        'lastname': validated_data['lastname'],
+        'address': validated_data['address'],
+        'phonenumber': str(validated_data['phonenumber']),
+        'products': [
+            {
+                'product_id': fields['product_id'],
+                'quantity': fields['quantity'],
+                'price': str(fields['price']),
+            }
+            for fields in validated_data['products']
+        ],
+    }
+
+
+def deserialize_order(record):
+    return {
+        **record,
+        'intake_id': uuid.UUID(record['intake_id']),
+        'products': [
+            {**fields, 'price': Decimal(fields['price'])}
+            for fields in record['products']
+        ],
+    }
+
+
+def append_orders(path, orders_data):
+    """Durably append validated orders, return their intake ids."""
+    intake_ids = [uuid.uuid4() for _ in orders_data]
+    records = b''
+    for intake_id, order_data in zip(intake_ids, orders_data):
+        payload = json.dumps(serialize_order(intake_id, order_data)).encode()
+        records += HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    with open(path, 'ab') as journal:
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        try:
+            journal.write(records)
+            journal.flush()
+            os.fsync(journal.fileno())
+        finally:
+            fcntl.flock(journal, fcntl.LOCK_UN)
+    return intake_ids
+
+
+def read_records(journal, offset, limit):
+    """Read up to `limit` complete records starting at `offset`.
+
+    A torn record at the end of the file, left by a crash or by a write
+    in progress, ends the reading.
+    """
+    journal.seek(offset)
+    records = []
+    while len(records) < limit:
+        header = journal.read(HEADER.size)
+        if len(header) < HEADER.size:
+            break
+        length, checksum = HEADER.unpack(header)
+        payload = journal.read(length)
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        offset += HEADER.size + length
+        records.append(json.loads(payload))
+    return records, offset
+
+
+def skip_torn_record(journal, offset):
+    """Find the next complete record after a torn one.
+
+    A record is torn if a crash interrupted its write; records appended
+    after the restart follow it. Returns the offset to continue from.
+    """
+    fcntl.flock(journal, fcntl.LOCK_EX)
+    try:
+        size = os.fstat(journal.fileno()).st_size
+        records, _ = read_records(journal, offset, 1)
+        if records or size == offset:
+            # It was a write in progress, not a torn record.
+            return offset
+        for next_offset in range(offset + 1, size):
+            records, _ = read_records(journal, next_offset, 1)
+            if records:
+                return next_offset
+        return size
+    finally:
+        fcntl.flock(journal, fcntl.LOCK_UN)
+
+
+def read_checkpoint(path):
+    try:
+        with open(f'{path}.offset') as checkpoint:
+            return int(checkpoint.read() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, offset):
+    temporary_path = f'{path}.offset.tmp'
+    with open(temporary_path, 'w') as checkpoint:
+        checkpoint.write(str(offset))
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+    os.replace(temporary_path, f'{path}.offset')
+
+
+@transaction.atomic
+def commit_records(records):
+    orders_data = [deserialize_order(record) for record in records]
+    committed_ids = set(
+        Order.objects
+        .filter(intake_id__in=[order['intake_id'] for order in orders_data])
+        .values_list('intake_id', flat=True)
+    )
+    new_orders = [
+        order_data
+        for order_data in orders_data
+        if order_data['intake_id'] not in committed_ids
+    ]
+    create_orders(new_orders)
+    return len(new_orders)
+
+
+def reject_record(path, record, error):
+    line = json.dumps({'error': str(error), 'record': record})
+    with open(f'{path}.rejected', 'a') as rejected:
+        rejected.write(line + '\n')
+        rejected.flush()
+        os.fsync(rejected.fileno())
+
+
+def commit_or_reject_records(path, records):
+    """Commit records, return how many were saved and how many rejected.
+
+    When the database refuses the batch, records are retried one by one,
+    so a bad record does not block the ones behind it.
+    """
+    try:
+        return commit_records(records), 0
+    except (IntegrityError, DataError):
+        pass
+
+    saved_count, rejected_count = 0, 0
+    for record in records:
+        try:
+            saved_count += commit_records([record])
+        except (IntegrityError, DataError) as error:
+            reject_record(path, record, error)
+            rejected_count += 1
+    return saved_count, rejected_count
+
+
+def truncate_if_drained(path, offset):
+    with open(path, 'r+b') as journal:
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        try:
+            if os.fstat(journal.fileno()).st_size != offset:
+                return False
+            # The checkpoint is reset first: if we crash before truncating,
+            # the journal is replayed and already saved orders are skipped.
+            write_checkpoint(path, 0)
+            journal.truncate(0)
+            os.fsync(journal.fileno())
+        finally:
+            fcntl.flock(journal, fcntl.LOCK_UN)
+    return True
+
+
+def drain_journal(path, batch_size):
+    """Commit journaled orders to the database.
+
+    Returns how many orders were saved and how many were rejected. Only
+    one drainer at a time works with a journal, others return at once.
+    """
+    if not os.path.exists(path):
+        return 0, 0
+
+    with open(f'{path}.lock', 'w') as drainer_lock:
+        try:
+            fcntl.flock(drainer_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0, 0
+
+        saved_count, rejected_count = 0, 0
+        offset = read_checkpoint(path)
+        with open(path, 'rb') as journal:
+            while True:
+                records, next_offset = read_records(
+                    journal, offset, batch_size)
+                if not records:
+                    size = os.fstat(journal.fileno()).st_size
+                    if offset == size:
+                        break
+                    next_offset = skip_torn_record(journal, offset)
+                    if next_offset == offset:
+                        break
+                    write_checkpoint(path, next_offset)
+                    offset = next_offset
+                    continue
+                batch_saved_count, batch_rejected_count = \
+                    commit_or_reject_records(path, records)
+                saved_count += batch_saved_count
+                rejected_count += batch_rejected_count
+                write_checkpoint(path, next_offset)
+                offset = next_offset
+
+        truncate_if_drained(path, offset)
+        return saved_count, rejected_count
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые суммы и количество товаров в заказах'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--active',
+            action='store_true',
+            help='Только незавершённые заказы',
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['active']:
+            orders = orders.exclude(status=Order.ChoicesStatus.COMPLETED)
+        updated_count = orders.refresh_totals()
+        self.stdout.write(f'Пересчитано заказов: {updated_count}')
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from foodcartapp.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Сверяет число ресторанов, где товар в продаже, с меню ресторанов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Исправить расхождения',
+        )
+
+    def handle(self, *args, **options):
+        broken_products = list(
+            Product.objects
+            .with_actual_availability()
+            .exclude(available_restaurants_count=F('actual_restaurants_count'))
+            .values_list(
+                'id',
+                'name',
+                'available_restaurants_count',
+                'actual_restaurants_count',
+            )
+        )
+        for product_id, name, stored_count, actual_count in broken_products:
+            self.stdout.write(
+                f'{product_id} {name}: '
+                f'записано {stored_count}, на самом деле {actual_count}')
+
+        if not broken_products:
+            self.stdout.write('Расхождений нет')
+            return
+
+        if options['repair']:
+            product_ids = [product[0] for product in broken_products]
+            Product.objects.filter(pk__in=product_ids).refresh_availability()
+            self.stdout.write(f'Исправлено товаров: {len(broken_products)}')
+        else:
+            self.stdout.write(
+                f'Расхождений: {len(broken_products)}, '
+                'запустите с --repair, чтобы исправить')
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodcartapp.journal import drain_journal
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет в базу заказы из журнала приёма заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько заказов сохранять в одной транзакции',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help='Пауза между проверками журнала, в секундах',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать журнал один раз и выйти',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            saved_count, rejected_count = drain_journal(
+                settings.ORDER_JOURNAL_PATH, options['batch_size'])
+            if saved_count:
+                self.stdout.write(f'Сохранено заказов: {saved_count}')
+            if rejected_count:
+                self.stderr.write(
+                    f'Отклонено заказов: {rejected_count}, см. '
+                    f'{settings.ORDER_JOURNAL_PATH}.rejected')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
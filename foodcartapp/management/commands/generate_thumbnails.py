@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.images import create_thumbnail
+from foodcartapp.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Создаёт превью картинок товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            action='append',
+            dest='sizes',
+            help='Размер превью из THUMBNAIL_SIZES, по умолчанию все',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать уже существующие превью',
+        )
+
+    def handle(self, *args, **options):
+        sizes = options['sizes'] or list(settings.THUMBNAIL_SIZES)
+        unknown_sizes = set(sizes) - set(settings.THUMBNAIL_SIZES)
+        if unknown_sizes:
+            raise CommandError(
+                f'Неизвестные размеры: {", ".join(sorted(unknown_sizes))}')
+
+        created, failed = 0, 0
+        for product in Product.objects.exclude(image='').iterator():
+            for size_name in sizes:
+                try:
+                    create_thumbnail(
+                        product.image, size_name, force=options['force'])
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'{product.image.name}: {error}')
+                    continue
+                created += 1
+
+        self.stdout.write(f'Готово превью: {created}, ошибок: {failed}')
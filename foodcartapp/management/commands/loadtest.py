@@ -0,0 +1,193 @@
+import json
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from statistics import mean
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from foodcartapp.models import Product
+
+
+ENDPOINTS = {
+    'order': ('POST', '/api/order/'),
+    'products': ('GET', '/api/products/'),
+}
+FIRSTNAMES = ['Иван', 'Мария', 'Пётр', 'Анна', 'Сергей', 'Ольга']
+LASTNAMES = ['Иванов', 'Смирнова', 'Кузнецов', 'Попова', 'Соколов']
+STREETS = ['Тверская', 'Арбат', 'Ленинский проспект', 'Профсоюзная']
+
+
+def generate_order(product_ids, index):
+    products_count = min(len(product_ids), random.randint(1, 5))
+    products = random.sample(product_ids, products_count)
+    return {
+        'firstname': random.choice(FIRSTNAMES),
+        'lastname': random.choice(LASTNAMES),
+        'address': 'Москва, {}, {}'.format(
+            random.choice(STREETS), random.randint(1, 150)),
+        # Distinct numbers, so phone throttling does not skew the results
+        'phonenumber': f'+7916{index % 10**7:07d}',
+        'products': [
+            {'product': product_id, 'quantity': random.randint(1, 3)}
+            for product_id in products
+        ],
+    }
+
+
+def get_host():
+    """Pick a host the test client may use, from ALLOWED_HOSTS."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            # A leading dot allows the domain itself as well
+            return host.lstrip('.')
+    # Allowed for any ALLOWED_HOSTS when DEBUG is on, or for ['*']
+    return 'localhost'
+
+
+def percentile(sorted_values, percent):
+    index = max(0, round(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает API запросами и выводит JSON с пропускной способностью, '
+        'задержками и числом SQL-запросов. Заказы сохраняются в базу, '
+        'поэтому для них нужен флаг --commit.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'endpoint',
+            choices=list(ENDPOINTS),
+            help='Какой эндпоинт нагружать',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Сколько запросов отправить',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Сколько запросов выполнять одновременно',
+        )
+        parser.add_argument(
+            '--url',
+            help=(
+                'Адрес запущенного сервера, например http://127.0.0.1:8000. '
+                'Без него запросы идут через тестовый клиент Django, '
+                'и считаются SQL-запросы. Все запросы к серверу идут с '
+                'одного IP, поэтому запустите его с увеличенным '
+                'ORDER_THROTTLE_CLIENT_RATE, например 1000000/min, '
+                'иначе заказы получат ответ 429'
+            ),
+        )
+        parser.add_argument(
+            '--commit',
+            action='store_true',
+            help='Разрешить сохранять в базу заказы, созданные нагрузкой',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для JSON с результатами, по умолчанию stdout',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('Нужен хотя бы один запрос и один поток')
+
+        method, path = ENDPOINTS[options['endpoint']]
+        payloads = [None] * options['requests']
+        if method == 'POST':
+            if not options['commit']:
+                raise CommandError(
+                    'Заказы будут сохранены в базу, запустите с --commit')
+            product_ids = list(
+                Product.objects.available().values_list('id', flat=True))
+            if not product_ids:
+                raise CommandError('Нет товаров в продаже')
+            payloads = [
+                generate_order(product_ids, index)
+                for index in range(options['requests'])
+            ]
+
+        if options['url']:
+            session = requests.Session()
+            url = options['url'].rstrip('/') + path
+
+            def send(index):
+                started_at = time.perf_counter()
+                response = session.request(method, url, json=payloads[index])
+                duration = time.perf_counter() - started_at
+                return response.status_code, duration, None
+        else:
+            host = get_host()
+
+            def send(index):
+                # Distinct client addresses, so client throttling does not
+                # skew the results. Each worker thread has its own connection.
+                # Errors are counted as 500 responses, as a server would do.
+                client = Client(
+                    raise_request_exception=False,
+                    HTTP_HOST=host,
+                    REMOTE_ADDR='10.{}.{}.{}'.format(
+                        index >> 16 & 255, index >> 8 & 255, index & 255),
+                )
+                started_at = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    if method == 'POST':
+                        response = client.post(
+                            path,
+                            json.dumps(payloads[index]),
+                            content_type='application/json',
+                        )
+                    else:
+                        response = client.get(path)
+                duration = time.perf_counter() - started_at
+                return response.status_code, duration, len(queries)
+
+        started_at = time.perf_counter()
+        concurrency = options['concurrency']
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(send, range(options['requests'])))
+        total_duration = time.perf_counter() - started_at
+
+        latencies = sorted(duration * 1000 for _, duration, _ in results)
+        query_counts = [count for _, _, count in results if count is not None]
+        report = {
+            'endpoint': options['endpoint'],
+            'target': options['url'] or 'test-client',
+            'requests': len(results),
+            'concurrency': options['concurrency'],
+            'duration_s': round(total_duration, 3),
+            'throughput_rps': round(len(results) / total_duration, 1),
+            'latency_ms': {
+                'mean': round(mean(latencies), 2),
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+                'max': round(latencies[-1], 2),
+            },
+            'queries_per_request': {
+                'mean': round(mean(query_counts), 2),
+                'max': max(query_counts),
+            } if query_counts else None,
+            'statuses': dict(Counter(str(status) for status, _, _ in results)),
+        }
+
+        output = json.dumps(report, indent=4)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
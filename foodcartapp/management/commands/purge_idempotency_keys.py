@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodcartapp.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие ключи идемпотентности'
+
+    def handle(self, *args, **options):
+        deleted_count, _ = (
+            IdempotencyKey.objects
+            .filter(expires_at__lte=timezone.now())
+            .delete()
+        )
+        self.stdout.write(f'Удалено ключей: {deleted_count}')
@@ -0,0 +1,12 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.throttling import get_throttle_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает, сколько запросов на заказ пропущено и отклонено'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(get_throttle_stats(), indent=4))
@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+from .catalog import CatalogIndex
+from .models import Restaurant, RestaurantMenuItem
+
+
+class MenuIndex(CatalogIndex):
+    """Products available in each restaurant right now."""
+
+    def __init__(self):
+        super().__init__()
+        self.restaurants = set()
+        self.menus = defaultdict(set)
+        self.menu_items = {}
+
+    def rebuild(self):
+        restaurants = set(Restaurant.objects.values_list('id', flat=True))
+        available_items = (
+            RestaurantMenuItem.objects
+            .filter(availability=True)
+            .values_list('id', 'restaurant_id', 'product_id')
+        )
+        menus = defaultdict(set)
+        menu_items = {}
+        for item_id, restaurant_id, product_id in available_items:
+            menus[restaurant_id].add(product_id)
+            menu_items[item_id] = (restaurant_id, product_id)
+
+        self.restaurants = restaurants
+        self.menus = menus
+        self.menu_items = menu_items
+
+    def update(self, sender, pk, instance, deleted):
+        if sender is Restaurant:
+            if deleted:
+                self.restaurants.discard(pk)
+                self.menus.pop(pk, None)
+            else:
+                self.restaurants.add(pk)
+        elif sender is RestaurantMenuItem:
+            # The item may have been moved to another restaurant or product,
+            # so the pair it was indexed under is dropped first.
+            if pk in self.menu_items:
+                restaurant_id, product_id = self.menu_items.pop(pk)
+                self.menus[restaurant_id].discard(product_id)
+            if not deleted and instance.availability:
+                pair = (instance.restaurant_id, instance.product_id)
+                self.menu_items[pk] = pair
+                self.menus[instance.restaurant_id].add(instance.product_id)
+
+    def get_menu(self, restaurant_id):
+        self.ensure_fresh()
+        with self.lock:
+            if restaurant_id not in self.restaurants:
+                return None
+            return set(self.menus.get(restaurant_id, ()))
+
+
+menu_index = MenuIndex()
@@ -0,0 +1,42 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import migrations
+
+
+DEFAULT_BANNERS = [
+    ('Burger', 'burger.jpg', 'Tasty Burger at your door step'),
+    ('Spices', 'food.jpg', 'All Cuisines'),
+    ('New York', 'tasty.jpg', 'Food is incomplete without a tasty dessert'),
+]
+
+
+def create_default_banners(apps, schema_editor):
+
+    Banner = apps.get_model('foodcartapp', 'Banner')
+
+    for position, (title, filename, text) in enumerate(DEFAULT_BANNERS):
+        path = os.path.join(settings.BASE_DIR, 'assets', filename)
+        if not os.path.exists(path):
+            continue
+        banner = Banner(title=title, text=text, position=position)
+        # The file is copied once, e.g. not again for every test database.
+        storage = banner.image.storage
+        name = f'banners/{filename}'
+        if not storage.exists(name):
+            with open(path, 'rb') as image:
+                name = storage.save(name, File(image))
+        banner.image.name = name
+        banner.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0063_banner'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_banners, migrations.RunPython.noop),
+    ]
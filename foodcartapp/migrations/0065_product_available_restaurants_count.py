@@ -0,0 +1,39 @@
+# Generated by Django 3.2.15 on 2026-10-18 16:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_available_restaurants(apps, schema_editor):
+
+    Product = apps.get_model('foodcartapp', 'Product')
+    RestaurantMenuItem = apps.get_model('foodcartapp', 'RestaurantMenuItem')
+
+    available_items = (
+        RestaurantMenuItem.objects
+        .filter(product=OuterRef('pk'), availability=True)
+        .order_by()
+        .values('product')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Product.objects.update(
+        available_restaurants_count=Coalesce(Subquery(available_items), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0064_create_default_banners'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='available_restaurants_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='в продаже в ресторанах'),
+        ),
+        migrations.RunPython(
+            count_available_restaurants, migrations.RunPython.noop),
+    ]
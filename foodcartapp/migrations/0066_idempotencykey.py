@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-18 16:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0065_product_available_restaurants_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='ключ')),
+                ('response_status', models.PositiveSmallIntegerField(verbose_name='код ответа')),
+                ('response_body', models.TextField(verbose_name='тело ответа')),
+                ('content_type', models.CharField(max_length=100, verbose_name='тип содержимого')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='создан')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='истекает')),
+            ],
+            options={
+                'verbose_name': 'ключ идемпотентности',
+                'verbose_name_plural': 'ключи идемпотентности',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.15 on 2026-10-18 16:51
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_order_totals(apps, schema_editor):
+
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+
+    items = (
+        OrderItem.objects
+        .filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+    )
+    totals = items.annotate(total=Sum(
+        F('quantity') * F('price'),
+        output_field=models.DecimalField(),
+    )).values('total')
+    items_counts = items.annotate(
+        items_count=Sum('quantity')).values('items_count')
+    Order.objects.update(
+        total=Coalesce(Subquery(totals), Decimal(0)),
+        items_count=Coalesce(Subquery(items_counts), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0067_order_intake_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='количество товаров'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='сумма заказа'),
+        ),
+        migrations.RunPython(count_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0068_order_total_order_items_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True, verbose_name='ключ')),
+                ('version', models.BigIntegerField(verbose_name='версия')),
+            ],
+            options={
+                'verbose_name': 'версия кэша',
+                'verbose_name_plural': 'версии кэша',
+            },
+        ),
+    ]
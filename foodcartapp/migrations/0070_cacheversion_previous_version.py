@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0069_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cacheversion',
+            name='previous_version',
+            field=models.BigIntegerField(default=0, verbose_name='предыдущая версия'),
+        ),
+    ]
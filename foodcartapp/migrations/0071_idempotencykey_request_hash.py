@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0070_cacheversion_previous_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='request_hash',
+            field=models.CharField(default='', max_length=64, verbose_name='хэш запроса'),
+        ),
+    ]
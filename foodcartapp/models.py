@@ -1,11 +1,19 @@
+from decimal import Decimal
+
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import F, Sum
-from django.db.models.signals import pre_save
+from django.db.models import (Case, Count, F, OuterRef, Q, Subquery, Sum,
+                              Value, When)
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
+from geo_location.models import GeoLocation
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .signals import menu_items_bulk_changed
+from .tracking import FieldTracker
+
 
 class Restaurant(models.Model):
     name = models.CharField(
@@ -22,6 +30,8 @@ class Restaurant(models.Model):
         blank=True,
     )
 
+    tracker = FieldTracker(['address'])
+
     class Meta:
         verbose_name = 'ресторан'
         verbose_name_plural = 'рестораны'
@@ -32,12 +42,28 @@ class Restaurant(models.Model):
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
+        return self.filter(available_restaurants_count__gt=0)
+
+    def with_actual_availability(self):
+        available_items = (
             RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+            .filter(product=OuterRef('pk'), availability=True)
+            .order_by()
+            .values('product')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return self.annotate(
+            actual_restaurants_count=Coalesce(Subquery(available_items), 0))
+
+    def refresh_availability(self):
+        actual_counts = (
+            Product.objects
+            .with_actual_availability()
+            .filter(pk=OuterRef('pk'))
+            .values('actual_restaurants_count')
         )
-        return self.filter(pk__in=products)
+        return self.update(available_restaurants_count=Subquery(actual_counts))
 
 
 class ProductCategory(models.Model):
@@ -86,6 +112,12 @@ class Product(models.Model):
         max_length=200,
         blank=True,
     )
+    available_restaurants_count = models.PositiveIntegerField(
+        'в продаже в ресторанах',
+        default=0,
+        db_index=True,
+        editable=False,
+    )
 
     objects = ProductQuerySet.as_manager()
 
@@ -96,6 +128,43 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if (not self._state.adding
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            # The count is kept by menu changes. An instance loaded before
+            # one of them must not write back its stale count.
+            deferred_fields = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred_fields
+                and field.name != 'available_restaurants_count'
+            ]
+        super().save(*args, **kwargs)
+
+
+class RestaurantMenuItemQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        items = list(self.values_list('pk', 'product_id'))
+        updated_count = super().update(**kwargs)
+
+        product_ids = {product_id for pk, product_id in items}
+        if 'product' in kwargs or 'product_id' in kwargs:
+            product_ids.update(
+                RestaurantMenuItem.objects
+                .filter(pk__in=[pk for pk, product_id in items])
+                .values_list('product_id', flat=True)
+            )
+        refresh_menu_products(product_ids)
+        return updated_count
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created_items = super().bulk_create(objs, *args, **kwargs)
+        refresh_menu_products({item.product_id for item in created_items})
+        return created_items
+
 
 class RestaurantMenuItem(models.Model):
     restaurant = models.ForeignKey(
@@ -116,6 +185,9 @@ class RestaurantMenuItem(models.Model):
         db_index=True
     )
 
+    objects = RestaurantMenuItemQuerySet.as_manager()
+    tracker = FieldTracker(['product'])
+
     class Meta:
         verbose_name = 'пункт меню ресторана'
         verbose_name_plural = 'пункты меню ресторана'
@@ -127,13 +199,94 @@ class RestaurantMenuItem(models.Model):
         return f"{self.restaurant.name} - {self.product.name}"
 
 
+class Banner(models.Model):
+    title = models.CharField(
+        'заголовок',
+        max_length=50
+    )
+    image = models.ImageField(
+        'картинка'
+    )
+    text = models.CharField(
+        'текст',
+        max_length=200,
+        blank=True,
+    )
+    position = models.PositiveIntegerField(
+        'порядок',
+        default=0,
+        db_index=True,
+    )
+    starts_at = models.DateTimeField(
+        'показывать с',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+    ends_at = models.DateTimeField(
+        'показывать до',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'баннер'
+        verbose_name_plural = 'баннеры'
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return self.title
+
+    def is_active(self, now):
+        return (
+            (self.starts_at is None or self.starts_at <= now)
+            and (self.ends_at is None or self.ends_at > now)
+        )
+
+
 class OrderQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        restaurant_field = next(
+            (field for field in ['cook_restaurant', 'cook_restaurant_id']
+             if field in kwargs),
+            None,
+        )
+        if restaurant_field and 'status' not in kwargs:
+            # Same as order_pre_saved: orders that get another restaurant
+            # go to the kitchen, in the same UPDATE.
+            restaurant = kwargs[restaurant_field]
+            restaurant_id = getattr(restaurant, 'pk', restaurant)
+            if restaurant_id is None:
+                unchanged = Q(cook_restaurant__isnull=True)
+            else:
+                unchanged = Q(cook_restaurant=restaurant_id)
+            kwargs['status'] = Case(
+                When(unchanged, then=F('status')),
+                default=Value(Order.ChoicesStatus.COOK),
+            )
+        return super().update(**kwargs)
+
     def with_amount(self):
-        return Order \
-            .objects \
-            .annotate(amount=Sum(
-                F('products__quantity') * F('products__price'))) \
-            .order_by('-id')
+        return self.annotate(amount=F('total'))
+
+    def refresh_totals(self):
+        items = (
+            OrderItem.objects
+            .filter(order=OuterRef('pk'))
+            .order_by()
+            .values('order')
+        )
+        totals = items.annotate(total=Sum(
+            F('quantity') * F('price'),
+            output_field=models.DecimalField(),
+        )).values('total')
+        items_counts = items.annotate(
+            items_count=Sum('quantity')).values('items_count')
+        return self.update(
+            total=Coalesce(Subquery(totals), Decimal(0)),
+            items_count=Coalesce(Subquery(items_counts), 0),
+        )
 
 
 class Order(models.Model):
@@ -208,14 +361,47 @@ class Order(models.Model):
         blank=True,
         verbose_name='Готовиться в',
     )
+    total = models.DecimalField(
+        'сумма заказа',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+    )
+    items_count = models.PositiveIntegerField(
+        'количество товаров',
+        default=0,
+        editable=False,
+    )
+    intake_id = models.UUIDField(
+        verbose_name='id в журнале заказов',
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+    )
 
     objects = OrderQuerySet.as_manager()
+    tracker = FieldTracker(['cook_restaurant', 'address'])
 
     class Meta:
         verbose_name = 'Оформление заказа'
         verbose_name_plural = 'Оформленные заказы'
         ordering = ['-status', 'id']
 
+    def update_totals(self):
+        Order.objects.filter(pk=self.pk).refresh_totals()
+        self.refresh_from_db(fields=['total', 'items_count'])
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is not None
+                and self.tracker.is_saved('cook_restaurant', update_fields)
+                and self.tracker.has_changed('cook_restaurant')):
+            # order_pre_saved changes the status as well
+            kwargs['update_fields'] = {*update_fields, 'status'}
+        super().save(*args, **kwargs)
+
     @property
     def full_name(self):
         return '%s %s' % (self.firstname, self.lastname)
@@ -256,12 +442,90 @@ class OrderItem(models.Model):
         return self.order.firstname
 
 
+class IdempotencyKey(models.Model):
+    key = models.CharField(
+        'ключ',
+        max_length=255,
+        unique=True,
+    )
+    request_hash = models.CharField(
+        'хэш запроса',
+        max_length=64,
+        default='',
+    )
+    response_status = models.PositiveSmallIntegerField(
+        'код ответа',
+    )
+    response_body = models.TextField(
+        'тело ответа',
+    )
+    content_type = models.CharField(
+        'тип содержимого',
+        max_length=100,
+    )
+    created_at = models.DateTimeField(
+        'создан',
+        default=timezone.now,
+    )
+    expires_at = models.DateTimeField(
+        'истекает',
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
+
+
+class CacheVersion(models.Model):
+    key = models.CharField(
+        'ключ',
+        max_length=50,
+        unique=True,
+    )
+    version = models.BigIntegerField(
+        'версия',
+    )
+    previous_version = models.BigIntegerField(
+        'предыдущая версия',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'версия кэша'
+        verbose_name_plural = 'версии кэша'
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
+
+
+def refresh_menu_products(product_ids):
+    Product.objects.filter(pk__in=product_ids).refresh_availability()
+    menu_items_bulk_changed.send(sender=RestaurantMenuItem)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def menu_item_changed(sender, instance, **kwargs):
+    product_ids = {instance.product_id, instance.tracker.previous('product')}
+    Product.objects.filter(pk__in=product_ids).refresh_availability()
+
+
 @receiver(pre_save, sender=Order)
-def order_pre_saved(sender, instance,  **kwargs):
-    old_cook_restaurant = (
-        instance.id
-        and
-        Order.objects.get(id=instance.id).cook_restaurant)
+def order_pre_saved(sender, instance, update_fields=None, **kwargs):
+    if not instance.tracker.is_saved('cook_restaurant', update_fields):
+        return
 
-    if instance.cook_restaurant != old_cook_restaurant:
+    if instance.tracker.has_changed('cook_restaurant'):
         instance.status = Order.ChoicesStatus.COOK
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Restaurant)
+def address_saved(sender, instance, created, **kwargs):
+    # Coordinates are resolved in background, see geocode_addresses.
+    if created or instance.tracker.has_changed('address'):
+        GeoLocation.objects.enqueue([instance.address])
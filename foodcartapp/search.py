@@ -0,0 +1,140 @@
+import re
+from collections import defaultdict
+
+from .catalog import CatalogIndex
+from .models import Product, ProductCategory
+
+
+WORD_RE = re.compile(r'\w+')
+TRIGRAM_LENGTH = 3
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def get_trigrams(word):
+    return {
+        word[start:start + TRIGRAM_LENGTH]
+        for start in range(len(word) - TRIGRAM_LENGTH + 1)
+    }
+
+
+class ProductSearchIndex(CatalogIndex):
+    """Case-insensitive search over product names, descriptions and categories.
+
+    Words shorter than a trigram match the beginning of a word, longer ones
+    match anywhere in the text, like `icontains`. Letter case and ё/е are
+    folded on both sides, which SQLite can not do for cyrillic.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.documents = {}
+        self.names = {}
+        self.product_fields = {}
+        self.categories = {}
+        self.prefixes = defaultdict(set)
+        self.trigrams = defaultdict(set)
+
+    def rebuild(self):
+        self.documents = {}
+        self.names = {}
+        self.product_fields = {}
+        self.categories = dict(
+            ProductCategory.objects.values_list('id', 'name')
+        )
+        self.prefixes = defaultdict(set)
+        self.trigrams = defaultdict(set)
+
+        products = Product.objects.values_list(
+            'id', 'name', 'description', 'category_id')
+        for product_id, name, description, category_id in products:
+            self.add_product(product_id, name, description, category_id)
+
+    def add_product(self, product_id, name, description, category_id):
+        self.remove_product(product_id)
+
+        category_name = self.categories.get(category_id, '')
+        document = normalize(' '.join([name, description, category_name]))
+        self.documents[product_id] = document
+        self.names[product_id] = normalize(name)
+        self.product_fields[product_id] = (name, description, category_id)
+
+        for word in set(WORD_RE.findall(document)):
+            for length in range(1, TRIGRAM_LENGTH):
+                self.prefixes[word[:length]].add(product_id)
+            for trigram in get_trigrams(word):
+                self.trigrams[trigram].add(product_id)
+
+    def remove_product(self, product_id):
+        document = self.documents.pop(product_id, None)
+        if document is None:
+            return
+        self.names.pop(product_id)
+        self.product_fields.pop(product_id)
+
+        for word in set(WORD_RE.findall(document)):
+            for length in range(1, TRIGRAM_LENGTH):
+                self.prefixes[word[:length]].discard(product_id)
+            for trigram in get_trigrams(word):
+                self.trigrams[trigram].discard(product_id)
+
+    def reindex_category(self, category_id, deleted=False):
+        for product_id, fields in list(self.product_fields.items()):
+            name, description, product_category_id = fields
+            if product_category_id != category_id:
+                continue
+            # Products of a deleted category lose it, see Product.category
+            if deleted:
+                product_category_id = None
+            self.add_product(
+                product_id, name, description, product_category_id)
+
+    def update(self, sender, pk, instance, deleted):
+        if sender is Product:
+            if deleted:
+                self.remove_product(pk)
+            else:
+                self.add_product(
+                    pk,
+                    instance.name,
+                    instance.description,
+                    instance.category_id,
+                )
+        elif sender is ProductCategory:
+            if deleted:
+                self.categories.pop(pk, None)
+            else:
+                self.categories[pk] = instance.name
+            self.reindex_category(pk, deleted)
+
+    def find_word(self, word):
+        if len(word) < TRIGRAM_LENGTH:
+            return set(self.prefixes.get(word, ()))
+
+        postings = [self.trigrams.get(trigram, set())
+                    for trigram in get_trigrams(word)]
+        candidates = set.intersection(*postings)
+        return {
+            product_id
+            for product_id in candidates
+            if word in self.documents[product_id]
+        }
+
+    def search(self, query):
+        words = WORD_RE.findall(normalize(query))
+        if not words:
+            return []
+
+        self.ensure_fresh()
+        with self.lock:
+            found = set.intersection(*[self.find_word(word) for word in words])
+            # Products with the query in their name go first.
+            return sorted(found, key=lambda product_id: (
+                not any(word in self.names[product_id] for word in words),
+                product_id,
+            ))
+
+
+product_search_index = ProductSearchIndex()
@@ -1,11 +1,17 @@
-from django.db import transaction
-from rest_framework.serializers import ModelSerializer
+from django.db import connection, transaction
+from geo_location.models import GeoLocation
+from rest_framework.serializers import (IntegerField, ModelSerializer,
+                                        PrimaryKeyRelatedField,
+                                        ValidationError)
 
+from .catalog import get_price_table
 from .models import Order, OrderItem
 
 
 class OrderItemSerializer(ModelSerializer):
 
+    product = IntegerField(source='product_id')
+
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity']
@@ -25,21 +31,65 @@ class OrderSerializer(ModelSerializer):
             'products',
         ]
 
+    def validate_products(self, products):
+        prices = get_price_table()
+        messages = PrimaryKeyRelatedField.default_error_messages
+        message = messages['does_not_exist']
+
+        errors = []
+        for fields in products:
+            product_id = fields['product_id']
+            if product_id in prices:
+                fields['price'] = prices[product_id]
+                errors.append({})
+            else:
+                errors.append({
+                    'product': [message.format(pk_value=product_id)],
+                })
+
+        if any(errors):
+            raise ValidationError(errors)
+        return products
+
     @transaction.atomic
     def create(self, validated_data):
-        order = Order.objects.create(
-            firstname=validated_data['firstname'],
-            lastname=validated_data['lastname'],
-            address=validated_data['address'],
-            phonenumber=validated_data['phonenumber'],
-        )
-        products = validated_data['products']
+        order, = create_orders([validated_data])
+        return order
+
 
-        items = [OrderItem(
-            order=order,
-            price=fields['product'].price,
-            **fields) for fields in products]
+def create_orders(orders_data):
+    orders = [
+        Order(
+            firstname=order_data['firstname'],
+            lastname=order_data['lastname'],
+            address=order_data['address'],
+            phonenumber=order_data['phonenumber'],
+            intake_id=order_data.get('intake_id'),
+            total=sum(
+                fields['quantity'] * fields['price']
+                for fields in order_data['products']
+            ),
+            items_count=sum(
+                fields['quantity'] for fields in order_data['products']
+            ),
+        )
+        for order_data in orders_data
+    ]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Order.objects.bulk_create(orders)
+        # bulk_create sends no post_save, so addresses are queued here.
+        GeoLocation.objects.enqueue([order.address for order in orders])
+    else:
+        # The database can not report ids of bulk inserted rows, and
+        # the items need them.
+        for order in orders:
+            order.save()
 
-        OrderItem.objects.bulk_create(items)
+    items = [
+        OrderItem(order=order, **fields)
+        for order, order_data in zip(orders, orders_data)
+        for fields in order_data['products']
+    ]
+    OrderItem.objects.bulk_create(items)
 
-        return order
+    return orders
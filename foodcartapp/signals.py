@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+
+# Sent after menu items are changed in bulk, bypassing post_save/post_delete.
+menu_items_bulk_changed = Signal()
@@ -0,0 +1,794 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from .capabilities import capability_index
+from .catalog import (CATALOG_VERSION_KEY, advance_version,
+                      bump_catalog_version)
+from .fast_validation import validate_order
+from .idempotency import find_stored_response
+from .images import create_thumbnail, get_thumbnail_urls
+from .journal import (HEADER, append_orders, commit_records, drain_journal,
+                      read_checkpoint, read_records, write_checkpoint)
+from .models import (IdempotencyKey, Order, Product, ProductCategory,
+                     Restaurant, RestaurantMenuItem)
+from .serializers import OrderSerializer
+from .throttling import admission_control
+
+
+def make_order_payload(**fields):
+    return {
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'address': 'Москва, Тверская, 1',
+        'phonenumber': '+79161234567',
+        'products': [{'product': Product.objects.get().id, 'quantity': 2}],
+        **fields,
+    }
+
+
+def append_order(path, firstname='Иван', product_id=None):
+    intake_id, = append_orders(path, [{
+        'firstname': firstname,
+        'lastname': 'Петров',
+        'address': 'Москва, Тверская, 1',
+        'phonenumber': '+79161234567',
+        'products': [{
+            'product_id': product_id or Product.objects.get().id,
+            'quantity': 2,
+            'price': Decimal('100'),
+        }],
+    }])
+    return intake_id
+
+
+def miss_stored_response_once():
+    """Act as if a concurrent request stored its response just after."""
+    misses = [None]
+
+    def find(key, request_hash):
+        if misses:
+            return misses.pop()
+        return find_stored_response(key, request_hash)
+
+    return patch('foodcartapp.idempotency.find_stored_response', find)
+
+
+class ApiTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = ProductCategory.objects.create(name='Бургеры')
+        product = Product.objects.create(
+            name='Чизбургер', category=category, price=100,
+            image='cheeseburger.jpg')
+        restaurant = Restaurant.objects.create(
+            name='Ресторан', address='Москва, Арбат, 1')
+        RestaurantMenuItem.objects.create(
+            restaurant=restaurant, product=product)
+
+    def setUp(self):
+        # Catalog versions and throttling state are not rolled back.
+        cache.clear()
+
+    def post_order(self, payload, **headers):
+        return self.client.post(
+            '/api/order/',
+            json.dumps(payload),
+            content_type='application/json',
+            **headers,
+        )
+
+
+class SnapshotResponseTest(ApiTestCase):
+
+    def test_etag_match_is_answered_without_queries(self):
+        response = self.client.get('/api/products/')
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_not_modified_since_is_answered_without_queries(self):
+        bump_catalog_version()
+        response = self.client.get('/api/products/')
+        last_modified = response['Last-Modified']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/products/', HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_catalog_is_sent_again(self):
+        response = self.client.get('/api/products/')
+        self.assertIsNone(response.get('Last-Modified'))
+
+        Product.objects.update(name='Гамбургер')
+        version = bump_catalog_version()
+        response = self.client.get(
+            '/api/products/',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=http_date(version // 10**9 - 1),
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['name'], 'Гамбургер')
+        self.assertEqual(response['Last-Modified'],
+                         http_date(version // 10**9))
+
+    def test_each_coding_has_own_etag(self):
+        etags = {}
+        for accept_encoding, content_encoding in [
+            ('', None),
+            ('gzip', 'gzip'),
+            ('gzip;q=0.5, br', 'br'),
+            ('br;q=0, gzip;q=0', None),
+        ]:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get(
+                    '/api/products/', HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertEqual(response.get('Content-Encoding'),
+                                 content_encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                etags.setdefault(content_encoding, response['ETag'])
+                self.assertEqual(etags[content_encoding], response['ETag'])
+        self.assertEqual(len(set(etags.values())), 3)
+
+        # A validator of another coding does not match.
+        response = self.client.get(
+            '/api/products/',
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=etags[None],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class CatalogIndexTest(ApiTestCase):
+
+    def test_bumps_are_chained(self):
+        version = bump_catalog_version()
+
+        previous_version, next_version = advance_version(CATALOG_VERSION_KEY)
+
+        self.assertEqual(previous_version, version)
+        self.assertGreater(next_version, version)
+
+    def test_change_made_by_other_process_is_not_lost(self):
+        product = Product.objects.get()
+        restaurant = Restaurant.objects.get()
+        capability_index.ensure_fresh()
+
+        # Another process adds a menu item and bumps the version, the
+        # indexes of this one only see the version move on.
+        other_restaurant = Restaurant.objects.create(
+            name='Другой ресторан', address='Москва, Арбат, 2')
+        RestaurantMenuItem.objects.create(
+            restaurant=other_restaurant, product=product)
+        bump_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Гамбургер'
+            product.save()
+
+        self.assertCountEqual(capability_index.match([product.id]),
+                              [restaurant.id, other_restaurant.id])
+
+
+class RestaurantMenuTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.restaurant = Restaurant.objects.get()
+        self.product = Product.objects.get()
+
+    def test_menu(self):
+        response = self.client.get(
+            f'/api/restaurants/{self.restaurant.id}/menu/')
+
+        self.assertEqual([product['id'] for product in response.json()],
+                         [self.product.id])
+
+    def test_unknown_restaurant_menu_is_not_found(self):
+        response = self.client.get(
+            f'/api/restaurants/{self.restaurant.id + 1}/menu/')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_restaurant_in_menus_is_null(self):
+        unknown_id = self.restaurant.id + 1
+        response = self.client.get(
+            '/api/restaurants/menu/',
+            {'ids': f'{self.restaurant.id},{unknown_id}'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        menus = response.json()
+        self.assertEqual([product['id']
+                          for product in menus[str(self.restaurant.id)]],
+                         [self.product.id])
+        self.assertIsNone(menus[str(unknown_id)])
+
+
+class ProductListTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        restaurant = Restaurant.objects.get()
+        burgers = ProductCategory.objects.get()
+        drinks = ProductCategory.objects.create(name='Напитки')
+        # Categories interleave with products, a null category goes first.
+        for index, category in enumerate([
+            drinks, None, burgers, None, drinks, burgers, None, drinks,
+        ]):
+            product = Product.objects.create(
+                name=f'Товар {index}',
+                category=category,
+                price=10 * index,
+                image=f'product{index}.jpg',
+            )
+            RestaurantMenuItem.objects.create(
+                restaurant=restaurant, product=product)
+        Product.objects.create(name='Не в продаже', price=1, image='no.jpg')
+
+    def get_pages(self, **params):
+        pages = []
+        url = '/api/products/'
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            pages.append(page['results'])
+            url, params = page['next'], {}
+        return pages
+
+    def test_pages_cover_catalog_once(self):
+        pages = self.get_pages(limit=2, fields='id')
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 2, 1])
+        product_ids = [product['id'] for page in pages for product in page]
+        available_products = Product.objects.available().order_by('id')
+        # Products without a category go first on every database.
+        expected_ids = [
+            *available_products
+            .filter(category=None)
+            .values_list('id', flat=True),
+            *available_products
+            .exclude(category=None)
+            .order_by('category_id', 'id')
+            .values_list('id', flat=True),
+        ]
+        self.assertEqual(product_ids, expected_ids)
+
+    def test_category_filter(self):
+        drinks = ProductCategory.objects.get(name='Напитки')
+
+        pages = self.get_pages(category=drinks.id, limit=2, fields='name')
+
+        self.assertEqual(
+            [product['name'] for page in pages for product in page],
+            ['Товар 0', 'Товар 4', 'Товар 7'],
+        )
+
+    def test_selected_fields(self):
+        with self.assertNumQueries(1):
+            pages = self.get_pages(limit=50, fields='id,category,price')
+
+        products = pages[0]
+        self.assertEqual(set(products[0]), {'id', 'category', 'price'})
+        self.assertIsNone(products[0]['category'])
+        self.assertEqual(products[-1]['category']['name'], 'Напитки')
+
+    def test_invalid_params(self):
+        for params, field in [
+            ({'limit': 0}, 'limit'),
+            ({'limit': 201}, 'limit'),
+            ({'limit': 'много'}, 'limit'),
+            ({'fields': 'id,weight'}, 'fields'),
+            ({'category': 'бургеры'}, 'category'),
+            ({'cursor': 'не курсор'}, 'cursor'),
+            ({'cursor': 'MQ=='}, 'cursor'),
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get('/api/products/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(response.json()), [field])
+
+
+class ProductAvailabilityTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.get()
+        self.restaurant = Restaurant.objects.get()
+        self.other_restaurant = Restaurant.objects.create(
+            name='Другой ресторан', address='Москва, Арбат, 2')
+
+    def get_count(self, product=None):
+        product = product or self.product
+        product.refresh_from_db(fields=['available_restaurants_count'])
+        return product.available_restaurants_count
+
+    def test_stale_product_save_keeps_count(self):
+        stale_product = Product.objects.get()
+        RestaurantMenuItem.objects.create(
+            restaurant=self.other_restaurant, product=self.product)
+
+        stale_product.price = 150
+        stale_product.save()
+
+        self.assertEqual(self.get_count(), 2)
+        self.assertEqual(Product.objects.get().price, 150)
+
+    def test_menu_item_save_and_delete(self):
+        menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.other_restaurant, product=self.product)
+        self.assertEqual(self.get_count(), 2)
+
+        menu_item.availability = False
+        menu_item.save()
+        self.assertEqual(self.get_count(), 1)
+
+        RestaurantMenuItem.objects.get(restaurant=self.restaurant).delete()
+        self.assertEqual(self.get_count(), 0)
+        self.assertFalse(Product.objects.available().exists())
+
+    def test_queryset_update(self):
+        RestaurantMenuItem.objects.update(availability=False)
+        self.assertEqual(self.get_count(), 0)
+
+        RestaurantMenuItem.objects.update(availability=True)
+        self.assertEqual(self.get_count(), 1)
+
+    def test_queryset_update_moving_items_to_other_product(self):
+        other_product = Product.objects.create(
+            name='Гамбургер', price=90, image='hamburger.jpg')
+
+        RestaurantMenuItem.objects.update(product=other_product)
+
+        self.assertEqual(self.get_count(), 0)
+        self.assertEqual(self.get_count(other_product), 1)
+
+    def test_bulk_create(self):
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(
+                restaurant=self.other_restaurant, product=self.product),
+        ])
+
+        self.assertEqual(self.get_count(), 2)
+
+    def test_bulk_update(self):
+        menu_items = list(RestaurantMenuItem.objects.all())
+        for menu_item in menu_items:
+            menu_item.availability = False
+
+        RestaurantMenuItem.objects.bulk_update(menu_items, ['availability'])
+
+        self.assertEqual(self.get_count(), 0)
+
+    def test_check_reports_and_repairs_drift(self):
+        Product.objects.update(available_restaurants_count=5)
+
+        stdout = StringIO()
+        call_command('check_product_availability', stdout=stdout)
+        self.assertIn('записано 5, на самом деле 1', stdout.getvalue())
+        self.assertEqual(self.get_count(), 5)
+
+        call_command('check_product_availability', '--repair',
+                     stdout=StringIO())
+        self.assertEqual(self.get_count(), 1)
+
+        stdout = StringIO()
+        call_command('check_product_availability', stdout=stdout)
+        self.assertIn('Расхождений нет', stdout.getvalue())
+
+
+class ThumbnailTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=directory.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def save_image(self, size):
+        content = BytesIO()
+        Image.new('RGB', size, 'orange').save(content, format='JPEG')
+        name = default_storage.save(
+            'burger.jpg', ContentFile(content.getvalue()))
+        return Product(image=name).image
+
+    def get_size(self, name):
+        with default_storage.open(name) as thumbnail:
+            return Image.open(thumbnail).size
+
+    def test_thumbnails_fit_sizes(self):
+        image = self.save_image((1200, 900))
+
+        self.assertEqual(self.get_size(create_thumbnail(image, 'small')),
+                         (50, 38))
+        self.assertEqual(self.get_size(create_thumbnail(image, 'large')),
+                         (600, 450))
+
+    def test_image_smaller_than_size_keeps_it(self):
+        image = self.save_image((400, 300))
+
+        thumbnail_name = create_thumbnail(image, 'large')
+
+        self.assertEqual(thumbnail_name, 'burger.large.jpg')
+        self.assertEqual(self.get_size(thumbnail_name), (400, 300))
+        self.assertEqual(get_thumbnail_urls(image), {
+            'small': '/media/burger.small.jpg',
+            'medium': '/media/burger.medium.jpg',
+            'large': '/media/burger.large.jpg',
+        })
+
+
+class IdempotencyTest(ApiTestCase):
+
+    def test_repeated_key_replays_response(self):
+        response = self.post_order(
+            make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+        replayed_response = self.post_order(
+            make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replayed_response.status_code, 200)
+        self.assertEqual(replayed_response['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed_response.content, response.content)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_response_is_not_stored(self):
+        response = self.post_order({}, HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_too_long_key_is_rejected(self):
+        response = self.post_order(
+            make_order_payload(), HTTP_IDEMPOTENCY_KEY='k' * 256)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_concurrent_request_with_same_key(self):
+        self.post_order(make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+
+        # The other request stored its response after this one looked.
+        with miss_stored_response_once():
+            response = self.post_order(
+                make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_other_request_is_rejected(self):
+        self.post_order(make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+
+        other_order_response = self.post_order(
+            make_order_payload(firstname='Мария'), HTTP_IDEMPOTENCY_KEY='key')
+        other_endpoint_response = self.client.post(
+            '/api/orders/batch/',
+            json.dumps([make_order_payload()]),
+            content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='key',
+        )
+
+        self.assertEqual(other_order_response.status_code, 422)
+        self.assertEqual(other_endpoint_response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_other_request_with_same_key_is_rejected(self):
+        self.post_order(make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+
+        with miss_stored_response_once():
+            response = self.post_order(
+                make_order_payload(firstname='Мария'),
+                HTTP_IDEMPOTENCY_KEY='key',
+            )
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_key_is_not_replayed(self):
+        self.post_order(make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+
+        response = self.post_order(
+            make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_purge_deletes_only_expired_keys(self):
+        self.post_order(make_order_payload(), HTTP_IDEMPOTENCY_KEY='old')
+        self.post_order(make_order_payload(), HTTP_IDEMPOTENCY_KEY='new')
+        IdempotencyKey.objects.filter(key='old').update(
+            expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+
+        self.assertQuerysetEqual(
+            IdempotencyKey.objects.values_list('key', flat=True), ['new'])
+
+
+class JournalTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'journal.bin')
+
+    def test_drain_saves_orders_and_truncates_journal(self):
+        intake_ids = {append_order(self.path), append_order(self.path)}
+
+        self.assertEqual(drain_journal(self.path, batch_size=1), (2, 0))
+
+        self.assertEqual(
+            set(Order.objects.values_list('intake_id', flat=True)),
+            intake_ids,
+        )
+        self.assertEqual(Order.objects.get(intake_id=intake_ids.pop()).total,
+                         200)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.assertEqual(read_checkpoint(self.path), 0)
+
+    def test_drain_continues_from_checkpoint(self):
+        append_order(self.path, 'Иван')
+        write_checkpoint(self.path, os.path.getsize(self.path))
+        append_order(self.path, 'Мария')
+
+        self.assertEqual(drain_journal(self.path, batch_size=10), (1, 0))
+        self.assertQuerysetEqual(
+            Order.objects.values_list('firstname', flat=True), ['Мария'])
+
+    def test_replayed_records_are_not_saved_twice(self):
+        append_order(self.path)
+        # A crash after the commit, before the checkpoint was written.
+        with open(self.path, 'rb') as journal:
+            records, _ = read_records(journal, 0, 10)
+        commit_records(records)
+
+        self.assertEqual(drain_journal(self.path, batch_size=10), (0, 0))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_torn_record_is_skipped(self):
+        append_order(self.path, 'Иван')
+        with open(self.path, 'ab') as journal:
+            # A record interrupted by a crash after its header.
+            journal.write(HEADER.pack(100, 0) + b'{"firstname"')
+        append_order(self.path, 'Мария')
+
+        self.assertEqual(drain_journal(self.path, batch_size=10), (2, 0))
+        self.assertQuerysetEqual(
+            Order.objects.order_by('id').values_list('firstname', flat=True),
+            ['Иван', 'Мария'],
+        )
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_concurrent_request_with_same_key_is_not_journaled(self):
+        with override_settings(
+            ORDER_INTAKE_MODE='journal',
+            ORDER_JOURNAL_PATH=self.path,
+        ):
+            response = self.post_order(
+                make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+            with miss_stored_response_once():
+                replayed_response = self.post_order(
+                    make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(replayed_response.content, response.content)
+        self.assertEqual(drain_journal(self.path, batch_size=10), (1, 0))
+
+
+
+class JournalRejectTest(TransactionTestCase):
+    # Foreign keys are checked on commit, which TestCase never does.
+
+    def setUp(self):
+        cache.clear()
+        ApiTestCase.setUpTestData()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'journal.bin')
+
+    def test_refused_record_does_not_block_journal(self):
+        append_order(self.path, 'Иван')
+        deleted_product = Product.objects.create(
+            name='Снят с продажи', price=100, image='removed.jpg')
+        rejected_intake_id = append_order(
+            self.path, 'Мария', product_id=deleted_product.id)
+        deleted_product.delete()
+        append_order(self.path, 'Пётр')
+
+        self.assertEqual(drain_journal(self.path, batch_size=10), (2, 1))
+
+        self.assertQuerysetEqual(
+            Order.objects.order_by('id').values_list('firstname', flat=True),
+            ['Иван', 'Пётр'],
+        )
+        with open(f'{self.path}.rejected') as rejected:
+            rejected_record, = [json.loads(line) for line in rejected]
+        self.assertEqual(rejected_record['record']['intake_id'],
+                         str(rejected_intake_id))
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.assertEqual(drain_journal(self.path, batch_size=10), (0, 0))
+
+class FieldTrackerTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.restaurant = Restaurant.objects.get()
+        self.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Петров',
+            address='Москва, Тверская, 1',
+            phonenumber='+79161234567',
+        )
+
+    def test_changes_are_tracked_until_save(self):
+        self.order.address = 'Москва, Арбат, 2'
+        self.order.cook_restaurant = self.restaurant
+
+        self.assertEqual(self.order.tracker.changed_fields,
+                         ['cook_restaurant', 'address'])
+        self.assertEqual(self.order.tracker.previous('address'),
+                         'Москва, Тверская, 1')
+
+        self.order.save()
+
+        self.assertEqual(self.order.tracker.changed_fields, [])
+
+    def test_update_fields_by_attname(self):
+        self.order.cook_restaurant_id = self.restaurant.id
+        self.order.save(update_fields=['cook_restaurant_id'])
+
+        self.assertFalse(self.order.tracker.has_changed('cook_restaurant'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.ChoicesStatus.COOK)
+
+    def test_refresh_from_db_resets_snapshot(self):
+        Order.objects.filter(pk=self.order.pk).update(
+            cook_restaurant=self.restaurant)
+
+        self.order.refresh_from_db()
+
+        self.assertEqual(self.order.cook_restaurant_id, self.restaurant.id)
+        self.assertFalse(self.order.tracker.has_changed('cook_restaurant'))
+
+    def test_deferred_field_is_not_reported(self):
+        order = Order.objects.only('id').get()
+
+        self.assertEqual(order.tracker.changed_fields, [])
+        self.assertEqual(order.address, 'Москва, Тверская, 1')
+        self.assertFalse(order.tracker.has_changed('address'))
+
+
+class FastValidationTest(ApiTestCase):
+
+    def get_fast_errors(self, payload):
+        try:
+            validate_order(payload)
+        except ValidationError as error:
+            return error.detail
+        return {}
+
+    def assertSameErrors(self, errors, expected_errors):
+        # Clients see messages only, error codes may differ.
+        self.assertEqual(json.loads(json.dumps(errors)),
+                         json.loads(json.dumps(expected_errors)))
+
+    def test_errors_match_serializer(self):
+        bad_fields = [
+            {'products': None},
+            {'products': []},
+            {'products': 'Чизбургер'},
+            {'products': [{'product': 0, 'quantity': 1}]},
+            {'products': [{'product': 'один', 'quantity': 0}]},
+            {'firstname': None, 'lastname': '', 'address': ['Тверская']},
+            {'firstname': 'И' * 51, 'lastname': '\x00'},
+            {'phonenumber': ''},
+            {'phonenumber': '---'},
+            {'phonenumber': '()'},
+            {'phonenumber': '+7 (916) 123'},
+            {'phonenumber': 'телефон'},
+        ]
+        bad_payloads = [
+            [],
+            {},
+            *({**make_order_payload(), **fields} for fields in bad_fields),
+        ]
+        for payload in bad_payloads:
+            with self.subTest(payload=payload):
+                serializer = OrderSerializer(data=payload)
+                self.assertFalse(serializer.is_valid())
+                self.assertSameErrors(self.get_fast_errors(payload),
+                                      serializer.errors)
+
+    def test_valid_phonenumber_is_normalized(self):
+        payload = make_order_payload(phonenumber=' +7 (916) 123-45-67')
+
+        self.assertEqual(validate_order(payload)['phonenumber'],
+                         '+79161234567')
+
+
+@override_settings(
+    ORDER_THROTTLE_CLIENT_RATE='3/min',
+    ORDER_THROTTLE_PHONE_RATE='2/min',
+)
+class AdmissionControlTest(ApiTestCase):
+
+    def test_phonenumber_is_throttled(self):
+        for _ in range(2):
+            self.post_order(make_order_payload())
+        response = self.post_order(make_order_payload())
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_client_is_throttled(self):
+        for index in range(3):
+            self.post_order(
+                make_order_payload(phonenumber=f'+7916123456{index}'))
+        response = self.post_order(
+            make_order_payload(phonenumber='+79161234569'))
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+
+    def test_replays_are_not_charged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_order(make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+        for _ in range(3):
+            response = self.post_order(
+                make_order_payload(), HTTP_IDEMPOTENCY_KEY='key')
+            self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+        response = self.post_order(make_order_payload())
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_excess_concurrent_request_is_rejected(self):
+        nested_responses = []
+
+        @admission_control(max_concurrency=1)
+        def view(request):
+            if not nested_responses:
+                # Arrives while this one still holds the only slot.
+                nested_responses.append(view(request))
+            return HttpResponse()
+
+        response = view(RequestFactory().post('/api/order/'))
+
+        self.assertEqual(response.status_code, 200)
+        nested_response, = nested_responses
+        self.assertEqual(nested_response.status_code, 503)
+        self.assertEqual(nested_response['Retry-After'], '1')
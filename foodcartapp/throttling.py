@@ -0,0 +1,150 @@
+"""Admission control for order intake.
+
+Requests are first admitted by a cap on concurrent requests in the
+process, then charged to token buckets of the client and of the phone
+number in the order. Both checks are done before any DB query.
+Repeated requests with an Idempotency-Key that already has a stored
+response are not charged, as they only replay the response.
+
+Bucket state lives in the cache, so all processes sharing the cache
+share the limits. Cache backends have no compare-and-swap, so concurrent
+requests of one client may occasionally pass a few extra tokens.
+"""
+import json
+import math
+import re
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+from .idempotency import is_response_stored
+
+
+THROTTLE_STATS_KEY = 'throttle:stats:{bucket}:{outcome}'
+THROTTLE_BUCKETS = ['client', 'phone', 'concurrency']
+PHONENUMBER_NOISE_RE = re.compile(r'[^\d+]')
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """Parse a DRF-style rate like '10/min' to (capacity, tokens/second)."""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+def count_request(bucket, outcome):
+    key = THROTTLE_STATS_KEY.format(bucket=bucket, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_throttle_stats():
+    keys = {
+        (bucket, outcome): THROTTLE_STATS_KEY.format(
+            bucket=bucket, outcome=outcome)
+        for bucket in THROTTLE_BUCKETS
+        for outcome in ('allowed', 'rejected')
+    }
+    values = cache.get_many(keys.values())
+    stats = {bucket: {} for bucket in THROTTLE_BUCKETS}
+    for (bucket, outcome), key in keys.items():
+        stats[bucket][outcome] = values.get(key, 0)
+    return stats
+
+
+def take_token(key, rate):
+    """Take a token from the bucket, return seconds to wait if it is empty."""
+    capacity, refill_rate = parse_rate(rate)
+    now = time.time()
+    tokens, updated_at = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+    if tokens < 1:
+        return (1 - tokens) / refill_rate
+
+    # A bucket is forgotten once it would have refilled completely.
+    cache.set(key, (tokens - 1, now), math.ceil(capacity / refill_rate))
+    return 0
+
+
+def get_phonenumber(request):
+    try:
+        phonenumber = json.loads(request.body).get('phonenumber')
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(phonenumber, str):
+        return None
+    return PHONENUMBER_NOISE_RE.sub('', phonenumber) or None
+
+
+def get_buckets(request):
+    key = request.headers.get('Idempotency-Key')
+    if key and is_response_stored(key):
+        return []
+
+    buckets = [(
+        'client',
+        f'throttle:client:{BaseThrottle().get_ident(request)}',
+        settings.ORDER_THROTTLE_CLIENT_RATE,
+    )]
+    phonenumber = get_phonenumber(request)
+    if phonenumber:
+        buckets.append((
+            'phone',
+            f'throttle:phone:{phonenumber}',
+            settings.ORDER_THROTTLE_PHONE_RATE,
+        ))
+    return buckets
+
+
+def reject(status, wait, detail):
+    response = JsonResponse(
+        {'detail': detail},
+        status=status,
+        json_dumps_params={'ensure_ascii': False},
+    )
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def admission_control(max_concurrency):
+    """Limit concurrent requests to the view and throttle clients.
+
+    Excess concurrent requests get 503, throttled clients get 429, both
+    with Retry-After.
+    """
+    slots = threading.BoundedSemaphore(max_concurrency)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not slots.acquire(blocking=False):
+                count_request('concurrency', 'rejected')
+                return reject(
+                    503, 1, 'Сервер перегружен, повторите запрос позже.')
+            try:
+                count_request('concurrency', 'allowed')
+                for bucket, key, rate in get_buckets(request):
+                    wait = take_token(key, rate)
+                    if wait:
+                        count_request(bucket, 'rejected')
+                        return reject(429, wait, (
+                            'Слишком много заказов, повторите через '
+                            f'{math.ceil(wait)} с.'
+                        ))
+                    count_request(bucket, 'allowed')
+                return view(request, *args, **kwargs)
+            finally:
+                slots.release()
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,110 @@
+from functools import wraps
+
+from django.db.models.signals import class_prepared, post_init
+
+
+class FieldTracker:
+    """Track changes of model fields since the instance was loaded or saved.
+
+    Declare it on a model and ask the instance:
+
+        tracker = FieldTracker(['status', 'cook_restaurant'])
+
+        order.tracker.has_changed('cook_restaurant')
+        order.tracker.changed_fields
+
+    Foreign keys are compared by id, so no related object is fetched.
+    An instance that is not saved yet has no previous values, they are
+    reported as None. Signal receivers still see the previous values:
+    they are reset only when `save()` or `refresh_from_db()` returns.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def contribute_to_class(self, cls, name):
+        self.name = name
+        self.snapshot_name = f'_{name}_snapshot'
+        setattr(cls, name, self)
+        class_prepared.connect(self.prepare_model, sender=cls, weak=False)
+
+    def prepare_model(self, sender, **kwargs):
+        self.attnames = {
+            field: sender._meta.get_field(field).attname
+            for field in self.fields
+        }
+        post_init.connect(self.take_snapshot, sender=sender, weak=False)
+
+        tracker = self
+        original_save = sender.save
+
+        @wraps(original_save)
+        def save(instance, *args, **kwargs):
+            original_save(instance, *args, **kwargs)
+            tracker.take_snapshot(
+                sender, instance, fields=kwargs.get('update_fields'))
+
+        sender.save = save
+
+        original_refresh_from_db = sender.refresh_from_db
+
+        @wraps(original_refresh_from_db)
+        def refresh_from_db(instance, *args, **kwargs):
+            original_refresh_from_db(instance, *args, **kwargs)
+            fields = args[1] if len(args) > 1 else kwargs.get('fields')
+            tracker.take_snapshot(sender, instance, fields=fields)
+
+        sender.refresh_from_db = refresh_from_db
+
+    def get_tracked_fields(self, fields):
+        """Pick tracked fields out of update_fields or refreshed fields."""
+        if fields is None:
+            return self.fields
+        return [
+            field
+            for field, attname in self.attnames.items()
+            if field in fields or attname in fields
+        ]
+
+    def take_snapshot(self, sender, instance, fields=None, **kwargs):
+        snapshot = instance.__dict__.setdefault(self.snapshot_name, {})
+        for field in self.get_tracked_fields(fields):
+            attname = self.attnames[field]
+            # Deferred fields are not loaded and have nothing to compare to.
+            if attname in instance.__dict__:
+                snapshot[field] = instance.__dict__[attname]
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return TrackedInstance(self, instance)
+
+
+class TrackedInstance:
+    def __init__(self, tracker, instance):
+        self.tracker = tracker
+        self.instance = instance
+
+    def previous(self, field):
+        if self.instance._state.adding:
+            return None
+        snapshot = self.instance.__dict__.get(self.tracker.snapshot_name, {})
+        return snapshot.get(field)
+
+    def is_saved(self, field, update_fields):
+        """Tell if `save(update_fields=...)` writes the field."""
+        return field in self.tracker.get_tracked_fields(update_fields)
+
+    def has_changed(self, field):
+        attname = self.tracker.attnames[field]
+        if attname not in self.instance.__dict__:
+            return False
+        return self.instance.__dict__[attname] != self.previous(field)
+
+    @property
+    def changed_fields(self):
+        return [
+            field
+            for field in self.tracker.fields
+            if self.has_changed(field)
+        ]
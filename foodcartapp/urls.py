@@ -1,12 +1,23 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import (product_list_api, banners_list_api, register_order,
+                    product_search_api, register_orders_batch,
+                    restaurant_menu_api, restaurants_menu_api)
+
+if settings.API_ASYNC_VIEWS:
+    from .async_views import (product_list_api, banners_list_api,  # noqa: F811
+                              register_order)
 
 
 app_name = "foodcartapp"
 
 urlpatterns = [
     path('products/', product_list_api),
+    path('products/search/', product_search_api),
     path('banners/', banners_list_api),
+    path('restaurants/menu/', restaurants_menu_api),
+    path('restaurants/<int:restaurant_id>/menu/', restaurant_menu_api),
     path('order/', register_order),
+    path('orders/batch/', register_orders_batch),
 ]
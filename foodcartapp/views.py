@@ -1,71 +1,317 @@
+import base64
+
+from django.conf import settings
 from django.db import transaction
-from django.http import JsonResponse
-from django.templatetags.static import static
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+from rest_framework import status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
+from .catalog import (PRODUCT_FIELD_SERIALIZERS, PRODUCT_FIELD_SOURCES,
+                      get_banners_snapshot, get_catalog_products,
+                      get_catalog_snapshot, get_json_dumps_params,
+                      serialize_product)
+from .fast_validation import validate_order
+from .idempotency import idempotent
+from .journal import append_orders
+from .menu_index import menu_index
 from .models import Product
-from .serializers import OrderSerializer
+from .search import product_search_index
+from .serializers import OrderSerializer, create_orders
+from .throttling import admission_control
+
+
+PRODUCTS_PAGE_SIZE = 50
+PRODUCTS_MAX_PAGE_SIZE = 200
+PRODUCT_LIST_PARAMS = {'cursor', 'limit', 'fields', 'category'}
+PREFERRED_ENCODINGS = ['br', 'gzip']
+ORDERS_BATCH_MAX_SIZE = 500
+
+
+def choose_encoding(accept_encoding, available_encodings):
+    weights = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.strip().partition(';')
+        try:
+            weight = float(params.strip().partition('q=')[2] or 1)
+        except ValueError:
+            weight = 0
+        weights[name.strip().lower()] = weight
+
+    best_encoding, best_weight = 'identity', 0
+    for encoding in PREFERRED_ENCODINGS:
+        weight = weights.get(encoding, weights.get('*', 0))
+        if encoding in available_encodings and weight > best_weight:
+            best_encoding, best_weight = encoding, weight
+    return best_encoding
+
+
+def snapshot_response(request, snapshot):
+    encoding = choose_encoding(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''),
+        snapshot.bodies,
+    )
+    etag = snapshot.etags[encoding]
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=snapshot.last_modified,
+    )
+    if response is None:
+        response = HttpResponse(
+            snapshot.bodies[encoding],
+            content_type='application/json',
+        )
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    if snapshot.last_modified is not None:
+        response['Last-Modified'] = http_date(snapshot.last_modified)
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
 
 
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
-        },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    return snapshot_response(request, get_banners_snapshot())
+
+
+def encode_cursor(product):
+    position = f'{product.category_order}:{product.id}'
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    position = base64.urlsafe_b64decode(cursor.encode()).decode()
+    category_order, product_id = position.split(':')
+    return int(category_order), int(product_id)
+
+
+def parse_product_list_params(params):
+    errors = {}
+    fields = [field for field in params.get('fields', '').split(',') if field]
+    unknown_fields = set(fields) - set(PRODUCT_FIELD_SERIALIZERS)
+    if unknown_fields:
+        errors['fields'] = [
+            f'Неизвестные поля: {", ".join(sorted(unknown_fields))}.']
+
+    try:
+        limit = int(params.get('limit', PRODUCTS_PAGE_SIZE))
+        if not 0 < limit <= PRODUCTS_MAX_PAGE_SIZE:
+            raise ValueError
+    except ValueError:
+        errors['limit'] = [
+            f'Ожидается число от 1 до {PRODUCTS_MAX_PAGE_SIZE}.']
+        limit = None
+
+    try:
+        category_id = int(params['category']) if 'category' in params else None
+    except ValueError:
+        errors['category'] = ['Ожидается id категории.']
+        category_id = None
+
+    cursor = None
+    if 'cursor' in params:
+        try:
+            cursor = decode_cursor(params['cursor'])
+        except (ValueError, UnicodeDecodeError):
+            errors['cursor'] = ['Неверный курсор.']
+
+    if errors:
+        raise ValidationError(errors)
+    fields = fields or list(PRODUCT_FIELD_SERIALIZERS)
+    return fields, limit, category_id, cursor
+
+
+def paginated_product_list_api(request):
+    try:
+        fields, limit, category_id, cursor = \
+            parse_product_list_params(request.GET)
+    except ValidationError as error:
+        return JsonResponse(
+            error.detail,
+            status=400,
+            json_dumps_params=get_json_dumps_params(),
+        )
+
+    model_fields = {
+        model_field
+        for field in fields
+        for model_field in PRODUCT_FIELD_SOURCES[field]
+    }
+    products = (
+        Product.objects
+        .available()
+        .only(*model_fields)
+        .annotate(category_order=Coalesce('category_id', 0))
+        .order_by('category_order', 'id')
+    )
+    if 'category' in fields:
+        products = products.select_related('category')
+    if category_id is not None:
+        products = products.filter(category_id=category_id)
+    if cursor:
+        category_order, product_id = cursor
+        products = products.filter(
+            Q(category_order__gt=category_order)
+            | Q(category_order=category_order, id__gt=product_id)
+        )
+
+    products = list(products[:limit + 1])
+    next_url = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_url = replace_query_param(
+            request.build_absolute_uri(),
+            'cursor',
+            encode_cursor(products[-1]),
+        )
+
+    return JsonResponse({
+        'next': next_url,
+        'results': [
+            serialize_product(product, fields)
+            for product in products
+        ],
+    }, json_dumps_params=get_json_dumps_params())
 
 
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    if PRODUCT_LIST_PARAMS.intersection(request.GET):
+        return paginated_product_list_api(request)
+    return snapshot_response(request, get_catalog_snapshot())
+
+
+def product_search_api(request):
+    catalog_products = get_catalog_products()
+    found_products = [
+        catalog_products[product_id]
+        for product_id in product_search_index.search(request.GET.get('q', ''))
+        if product_id in catalog_products
+    ]
+    return JsonResponse(
+        found_products,
+        safe=False,
+        json_dumps_params=get_json_dumps_params(),
+    )
+
+
+def get_menu_products(restaurant_id, catalog_products):
+    product_ids = menu_index.get_menu(restaurant_id)
+    if product_ids is None:
+        return None
+    return [
+        product
+        for product_id, product in catalog_products.items()
+        if product_id in product_ids
+    ]
+
+
+def restaurant_menu_api(request, restaurant_id):
+    menu = get_menu_products(restaurant_id, get_catalog_products())
+    if menu is None:
+        raise Http404('Ресторан не найден')
+    return JsonResponse(
+        menu,
+        safe=False,
+        json_dumps_params=get_json_dumps_params(),
+    )
+
+
+def restaurants_menu_api(request):
+    try:
+        restaurant_ids = [
+            int(restaurant_id)
+            for restaurant_id in request.GET.get('ids', '').split(',')
+            if restaurant_id
+        ]
+    except ValueError:
+        return JsonResponse(
+            {'ids': ['Ожидается список id ресторанов через запятую.']},
+            status=400,
+            json_dumps_params=get_json_dumps_params(),
+        )
 
+    catalog_products = get_catalog_products()
+    # Unknown restaurants get null, a stale id does not break other menus.
+    menus = {
+        restaurant_id: get_menu_products(restaurant_id, catalog_products)
+        for restaurant_id in restaurant_ids
+    }
+    return JsonResponse(menus, json_dumps_params=get_json_dumps_params())
 
+
+@admission_control(settings.ORDER_MAX_CONCURRENCY)
+@idempotent
 @api_view(['POST'])
 @transaction.atomic
 def register_order(request):
 
-    serializer = OrderSerializer(data=request.data)
-    serializer.is_valid(raise_exception=True)
+    if settings.ORDER_VALIDATION_ENGINE == 'fast':
+        serializer = None
+        order_data = validate_order(request.data)
+    else:
+        serializer = OrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order_data = serializer.validated_data
+
+    if settings.ORDER_INTAKE_MODE == 'journal':
+        intake_id, = append_orders(settings.ORDER_JOURNAL_PATH, [order_data])
+        response_data = {'intake_id': intake_id}
+        if serializer:
+            response_data = {**serializer.data, **response_data}
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
+    if not serializer:
+        order, = create_orders([order_data])
+        return Response({'id': order.id})
 
     serializer.save()
     return Response(serializer.data)
+
+
+@idempotent
+@api_view(['POST'])
+def register_orders_batch(request):
+    if not isinstance(request.data, list):
+        message = ListSerializer.default_error_messages['not_a_list']
+        raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+            message.format(input_type=type(request.data).__name__)]})
+    if len(request.data) > ORDERS_BATCH_MAX_SIZE:
+        raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+            f'Не больше {ORDERS_BATCH_MAX_SIZE} заказов за раз.']})
+
+    results = []
+    valid_orders = []
+    fast_validation = settings.ORDER_VALIDATION_ENGINE == 'fast'
+    for index, order_data in enumerate(request.data):
+        if fast_validation:
+            try:
+                valid_orders.append((index, validate_order(order_data)))
+                results.append(None)
+            except ValidationError as error:
+                results.append({'index': index, 'errors': error.detail})
+            continue
+
+        serializer = OrderSerializer(data=order_data)
+        if serializer.is_valid():
+            valid_orders.append((index, serializer.validated_data))
+            results.append(None)
+        else:
+            results.append({'index': index, 'errors': serializer.errors})
+
+    with transaction.atomic():
+        orders = create_orders([order_data for _, order_data in valid_orders])
+
+    for (index, _), order in zip(valid_orders, orders):
+        results[index] = {'index': index, 'id': order.id}
+    return Response(results)
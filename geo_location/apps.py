@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GeoLocationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'geo_location'
+
+    def ready(self):
+        from . import cache  # noqa: F401
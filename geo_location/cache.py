@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import GeoLocation
+
+
+class GeocodeCache:
+    """Coordinates of addresses, kept in the process memory.
+
+    Up to `max_size` recently used addresses are kept for `ttl` seconds.
+    Addresses missing in memory are fetched from GeoLocation in one query.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.locations = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, address, coordinates):
+        with self.lock:
+            expires_at = time.monotonic() + self.ttl
+            self.locations[address] = (coordinates, expires_at)
+            self.locations.move_to_end(address)
+            while len(self.locations) > self.max_size:
+                self.locations.popitem(last=False)
+
+    def evict(self, address):
+        with self.lock:
+            self.locations.pop(address, None)
+
+    def clear(self):
+        with self.lock:
+            self.locations.clear()
+
+    def get_cached(self, addresses):
+        now = time.monotonic()
+        found = {}
+        with self.lock:
+            for address in addresses:
+                coordinates, expires_at = self.locations.get(
+                    address, (None, 0))
+                if expires_at <= now:
+                    self.locations.pop(address, None)
+                    self.misses += 1
+                    continue
+                self.locations.move_to_end(address)
+                found[address] = coordinates
+                self.hits += 1
+        return found
+
+    def get_many(self, addresses):
+        """Return {address: (lon, lat)} of geocoded addresses.
+
+        Addresses waiting for geocoding are left out and not cached.
+        """
+        addresses = set(addresses)
+        found = self.get_cached(addresses)
+        missing_addresses = addresses - set(found)
+        if missing_addresses:
+            stored_locations = GeoLocation.objects.filter(
+                address__in=missing_addresses, is_pending=False)
+            for location in stored_locations:
+                coordinates = (location.longitude, location.latitude)
+                self.put(location.address, coordinates)
+                found[location.address] = coordinates
+        return found
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'size': len(self.locations),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+geocode_cache = GeocodeCache(
+    settings.GEOCODE_CACHE_SIZE, settings.GEOCODE_CACHE_TTL)
+
+
+@receiver([post_save, post_delete], sender=GeoLocation)
+def location_changed(sender, instance, **kwargs):
+    # Evicted after commit, so the old coordinates are not read back.
+    transaction.on_commit(lambda: geocode_cache.evict(instance.address))
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from restaurateur import geo_coder
+
+from .models import GeoLocation
+
+
+# The geocoder refused the address itself. Other HTTP errors, such as 403
+# for a bad key or an exhausted quota, 429 or 5xx, are about the service.
+ADDRESS_ERROR_STATUSES = {400, 404, 414, 422}
+
+
+def is_address_error(error):
+    if not isinstance(error, requests.HTTPError):
+        return False
+    status_code = getattr(error.response, 'status_code', None)
+    return status_code in ADDRESS_ERROR_STATUSES
+
+
+def is_service_error(error):
+    return (
+        isinstance(error, requests.HTTPError)
+        and not is_address_error(error)
+    )
+
+
+def postpone(location, now, count_attempt=True):
+    """Schedule another attempt, or give up after the last one.
+
+    Failures of the service say nothing about the address and are not
+    counted, so an outage does not use up the attempts of the queue.
+    """
+    if count_attempt:
+        location.attempts += 1
+        if location.attempts >= settings.GEOCODE_MAX_ATTEMPTS:
+            location.is_pending = False
+            location.retry_at = None
+            return
+    delay = settings.GEOCODE_RETRY_DELAY * 2 ** max(location.attempts - 1, 0)
+    location.retry_at = now + timedelta(seconds=delay)
+
+
+def geocode_pending(limit):
+    """Geocode queued addresses, return how many were resolved.
+
+    An address the geocoder rejects is stored without coordinates. The
+    ones failed for other errors go to the end of the queue until their
+    retry time. After GEOCODE_MAX_ATTEMPTS timeouts or unexpected answers
+    an address is stored without coordinates, while errors of the service
+    itself are retried until it recovers.
+    """
+    now = timezone.now()
+    locations = list(
+        GeoLocation.objects
+        .filter(is_pending=True)
+        .filter(Q(retry_at__isnull=True) | Q(retry_at__lte=now))
+        .order_by(F('retry_at').asc(nulls_first=True), 'id')[:limit]
+    )
+    found, errors = geo_coder.fetch_many(
+        settings.YANDEX_GEOCODER_KEY,
+        [location.address for location in locations],
+    )
+
+    resolved_count = 0
+    for location in locations:
+        error = errors.get(location.address)
+        if error and not is_address_error(error):
+            postpone(location, now, count_attempt=not is_service_error(error))
+            continue
+        coordinates = found.get(location.address)
+        location.longitude, location.latitude = coordinates or (None, None)
+        location.is_pending = False
+        resolved_count += 1
+
+    GeoLocation.objects.bulk_update(locations, [
+        'longitude', 'latitude', 'is_pending', 'attempts', 'retry_at'])
+    return resolved_count
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from geo_location.geocoding import geocode_pending
+
+
+class Command(BaseCommand):
+    help = 'Определяет координаты адресов заказов и ресторанов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Сколько адресов обрабатывать за раз',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help='Пауза между проверками очереди, в секундах',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь один раз и выйти',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            resolved_count = geocode_pending(options['batch_size'])
+            if resolved_count:
+                self.stdout.write(f'Определено адресов: {resolved_count}')
+            if resolved_count < options['batch_size']:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geo_location', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geolocation',
+            name='is_pending',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='ждёт геокодирования'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.15 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geo_location', '0002_geolocation_is_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geolocation',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='неудачных попыток геокодирования'),
+        ),
+        migrations.AddField(
+            model_name='geolocation',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='следующая попытка геокодирования'),
+        ),
+    ]
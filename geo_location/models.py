@@ -1,6 +1,19 @@
 from django.db import models
 
 
+class GeoLocationQuerySet(models.QuerySet):
+    def enqueue(self, addresses):
+        """Queue new addresses for the geocode_addresses worker."""
+        return self.bulk_create(
+            [
+                GeoLocation(address=address, is_pending=True)
+                for address in set(addresses)
+                if address
+            ],
+            ignore_conflicts=True,
+        )
+
+
 class GeoLocation(models.Model):
     address = models.CharField(
         'адрес',
@@ -15,6 +28,23 @@ class GeoLocation(models.Model):
         verbose_name='долгота',
         null=True
     )
+    is_pending = models.BooleanField(
+        'ждёт геокодирования',
+        default=False,
+        db_index=True,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        'неудачных попыток геокодирования',
+        default=0,
+    )
+    retry_at = models.DateTimeField(
+        'следующая попытка геокодирования',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+
+    objects = GeoLocationQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Локация'
@@ -1,13 +1,30 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
 import requests
+from requests.adapters import HTTPAdapter
+
+
+BASE_URL = "https://geocode-maps.yandex.ru/1.x"
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+MAX_WORKERS = 8
+
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_maxsize=MAX_WORKERS))
+
+executor = ThreadPoolExecutor(
+    max_workers=MAX_WORKERS, thread_name_prefix='geo_coder')
+in_flight = {}
+in_flight_lock = threading.Lock()
 
 
 def fetch_coordinates(apikey, address):
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(base_url, params={
+    response = session.get(BASE_URL, params={
         "geocode": address,
         "apikey": apikey,
         "format": "json",
-    })
+    }, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
     response.raise_for_status()
     found_places = response\
         .json()['response']['GeoObjectCollection']['featureMember']
@@ -18,3 +35,40 @@ def fetch_coordinates(apikey, address):
     most_relevant = found_places[0]
     lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
     return lon, lat
+
+
+def submit(apikey, address):
+    """Schedule a lookup, or join the one of the same address in progress."""
+    key = (apikey, address)
+    with in_flight_lock:
+        future = in_flight.get(key)
+        if future is not None:
+            return future
+        future = executor.submit(fetch_coordinates, apikey, address)
+        in_flight[key] = future
+    future.add_done_callback(lambda _: forget(key))
+    return future
+
+
+def forget(key):
+    with in_flight_lock:
+        in_flight.pop(key, None)
+
+
+def fetch_many(apikey, addresses):
+    """Look up addresses in parallel.
+
+    Returns ({address: coordinates}, {address: error}), where errors are
+    the exceptions raised by `fetch_coordinates`.
+    """
+    futures = {address: submit(apikey, address) for address in set(addresses)}
+    wait(futures.values())
+
+    found, errors = {}, {}
+    for address, future in futures.items():
+        error = future.exception()
+        if error:
+            errors[address] = error
+        else:
+            found[address] = future.result()
+    return found, errors
@@ -1,3 +1,261 @@
-from django.test import TestCase
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from foodcartapp.capabilities import capability_index
+from foodcartapp.catalog import bump_catalog_version
+from foodcartapp.models import (Order, OrderItem, Product, Restaurant,
+                                RestaurantMenuItem)
+from geo_location.cache import geocode_cache
+from geo_location.geocoding import geocode_pending
+from geo_location.models import GeoLocation
+from restaurateur import geo_coder
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f'{status_code} Error', response=response)
+
+
+def locate(address, longitude, latitude):
+    GeoLocation.objects.filter(address=address).update(
+        longitude=longitude, latitude=latitude, is_pending=False)
+
+
+class ViewOrdersTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(
+            'manager', password='password', is_staff=True)
+
+        cls.restaurants = [
+            Restaurant.objects.create(
+                name=f'Ресторан {index}', address=f'Москва, Арбат, {index}')
+            for index in range(3)
+        ]
+        cls.products = [
+            Product.objects.create(name=f'Бургер {index}', price=100)
+            for index in range(3)
+        ]
+        # The last product is cooked only in the first restaurant.
+        for restaurant in cls.restaurants:
+            for product in cls.products[:2]:
+                RestaurantMenuItem.objects.create(
+                    restaurant=restaurant, product=product)
+        RestaurantMenuItem.objects.create(
+            restaurant=cls.restaurants[0], product=cls.products[2])
+
+        for index, restaurant in enumerate(cls.restaurants):
+            locate(restaurant.address, 37.6 + index / 100, 55.7)
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+        # Changes of test data are never committed, so indexes are
+        # rebuilt by hand.
+        bump_catalog_version()
+        capability_index.ensure_fresh()
+        geocode_cache.clear()
+
+    def create_orders(self, count, products, located=True):
+        for index in range(count):
+            order = Order.objects.create(
+                firstname='Иван',
+                lastname='Петров',
+                address=f'Москва, Тверская, {index}',
+                phonenumber='+79161234567',
+            )
+            if located:
+                locate(order.address, 37.6, 55.75)
+            for product in products:
+                OrderItem.objects.create(
+                    order=order, product=product, quantity=1, price=100)
+
+    def get_orders_page(self):
+        return self.client.get(reverse('restaurateur:view_orders'))
+
+    def test_queries_do_not_depend_on_orders_count(self):
+        self.create_orders(2, self.products[:2])
+        with self.assertNumQueries(6):
+            self.get_orders_page()
+
+        self.create_orders(30, self.products)
+        with self.assertNumQueries(6):
+            response = self.get_orders_page()
+        self.assertEqual(len(response.context['orders']), 32)
+
+    def test_coordinates_are_cached_between_requests(self):
+        self.create_orders(2, self.products[:2])
+        self.get_orders_page()
+
+        hits = geocode_cache.get_stats()['hits']
+        with self.assertNumQueries(5):
+            self.get_orders_page()
+        self.assertEqual(geocode_cache.get_stats()['hits'], hits + 5)
+
+    def test_restaurants_cook_all_products_of_order(self):
+        self.create_orders(1, self.products)
+        response = self.get_orders_page()
+
+        order, = response.context['orders']
+        self.assertTrue(order.availability_geo)
+        self.assertEqual(order.access_restaurants, [self.restaurants[0]])
+        self.assertIsNotNone(order.access_restaurants[0].distance)
+
+    def test_new_addresses_are_pending(self):
+        self.create_orders(1, self.products, located=False)
+        response = self.get_orders_page()
+
+        order, = response.context['orders']
+        self.assertTrue(order.location_pending)
+        self.assertIsNone(order.access_restaurants[0].distance)
+        self.assertContains(response, 'Координаты адреса ещё определяются')
+
+        restaurant = self.restaurants[1]
+        restaurant.address = 'Москва, Новый Арбат, 1'
+        restaurant.save()
+        self.assertTrue(
+            GeoLocation.objects.get(address=restaurant.address).is_pending)
+
+    @patch('restaurateur.geo_coder.fetch_coordinates')
+    def test_pending_addresses_are_geocoded(self, fetch_coordinates):
+        fetch_coordinates.return_value = ('37.61', '55.76')
+        self.create_orders(2, self.products, located=False)
+
+        self.assertEqual(geocode_pending(limit=10), 2)
+        self.assertEqual(fetch_coordinates.call_count, 2)
+        response = self.get_orders_page()
+        for order in response.context['orders']:
+            self.assertFalse(order.location_pending)
+            self.assertTrue(order.availability_geo)
+
+    @patch('restaurateur.geo_coder.fetch_coordinates')
+    def test_unreachable_geocoder_keeps_addresses_queued(
+            self, fetch_coordinates):
+        errors = {
+            'Москва, Тверская, 0': http_error(400),
+            'Москва, Тверская, 1': requests.ConnectionError(),
+        }
+
+        def fetch(apikey, address):
+            raise errors[address]
+
+        fetch_coordinates.side_effect = fetch
+        self.create_orders(2, self.products, located=False)
+
+        self.assertEqual(geocode_pending(limit=10), 1)
+        rejected = GeoLocation.objects.get(address='Москва, Тверская, 0')
+        self.assertFalse(rejected.is_pending)
+        self.assertIsNone(rejected.longitude)
+        self.assertTrue(
+            GeoLocation.objects.get(address='Москва, Тверская, 1').is_pending)
+
+    @override_settings(GEOCODE_MAX_ATTEMPTS=2)
+    @patch('restaurateur.geo_coder.fetch_coordinates')
+    def test_failing_addresses_are_retried_later(self, fetch_coordinates):
+        fetch_coordinates.side_effect = KeyError('response')
+        self.create_orders(1, self.products, located=False)
+        location = GeoLocation.objects.get(address='Москва, Тверская, 0')
+
+        self.assertEqual(geocode_pending(limit=10), 0)
+        location.refresh_from_db()
+        self.assertTrue(location.is_pending)
+        self.assertEqual(location.attempts, 1)
+        self.assertIsNotNone(location.retry_at)
+
+        # Not retried before its time, so other addresses go first.
+        self.assertEqual(geocode_pending(limit=10), 0)
+        self.assertEqual(fetch_coordinates.call_count, 1)
+
+        location.retry_at -= timedelta(seconds=settings.GEOCODE_RETRY_DELAY)
+        location.save(update_fields=['retry_at'])
+        self.assertEqual(geocode_pending(limit=10), 0)
+        location.refresh_from_db()
+        self.assertFalse(location.is_pending)
+        self.assertIsNone(location.longitude)
+        self.assertEqual(fetch_coordinates.call_count, 2)
+
+    def test_availability_changes_are_matched(self):
+        menu_item = RestaurantMenuItem.objects.get(
+            restaurant=self.restaurants[0], product=self.products[2])
+        with self.captureOnCommitCallbacks(execute=True):
+            menu_item.availability = False
+            menu_item.save()
+        product_ids = [product.id for product in self.products]
+        self.assertEqual(capability_index.match(product_ids), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.create(
+                restaurant=self.restaurants[2], product=self.products[2])
+        self.assertEqual(
+            capability_index.match(product_ids), [self.restaurants[2].id])
+
+    @patch('restaurateur.geo_coder.fetch_coordinates')
+    def test_service_errors_do_not_use_up_attempts(self, fetch_coordinates):
+        errors = {
+            'Москва, Тверская, 0': http_error(503),
+            'Москва, Тверская, 1': http_error(429),
+            'Москва, Тверская, 2': http_error(403),
+        }
+
+        def fetch(apikey, address):
+            raise errors[address]
+
+        fetch_coordinates.side_effect = fetch
+        self.create_orders(3, self.products, located=False)
+
+        with override_settings(GEOCODE_MAX_ATTEMPTS=1):
+            self.assertEqual(geocode_pending(limit=10), 0)
+
+        locations = GeoLocation.objects.filter(address__in=errors)
+        self.assertEqual(len(locations), 3)
+        for location in locations:
+            self.assertTrue(location.is_pending)
+            self.assertEqual(location.attempts, 0)
+            self.assertIsNotNone(location.retry_at)
+
+
+class GeoCoderTest(SimpleTestCase):
+
+    def test_concurrent_lookups_of_same_address_are_shared(self):
+        fetched_addresses = Counter()
+        release = threading.Event()
+        waiting = threading.Semaphore(0)
+
+        def fetch_coordinates(apikey, address):
+            fetched_addresses[address] += 1
+            release.wait(timeout=5)
+            return ('37.6', '55.7')
+
+        def wait_for_lookups(futures):
+            # Every lookup of the caller is submitted by now.
+            waiting.release()
+            return wait(futures)
+
+        with patch.object(geo_coder, 'fetch_coordinates', fetch_coordinates), \
+                patch.object(geo_coder, 'wait', wait_for_lookups), \
+                ThreadPoolExecutor(max_workers=2) as callers:
+            results = [
+                callers.submit(geo_coder.fetch_many, 'key', addresses)
+                for addresses in [['Арбат, 1', 'Арбат, 2'],
+                                  ['Арбат, 2', 'Арбат, 3']]
+            ]
+            for _ in results:
+                self.assertTrue(waiting.acquire(timeout=5))
+            release.set()
+            (first_found, _), (second_found, _) = [
+                result.result(timeout=5) for result in results]
+
+        self.assertEqual(fetched_addresses, {
+            'Арбат, 1': 1, 'Арбат, 2': 1, 'Арбат, 3': 1})
+        self.assertEqual(set(first_found), {'Арбат, 1', 'Арбат, 2'})
+        self.assertEqual(set(second_found), {'Арбат, 2', 'Арбат, 3'})
@@ -1,5 +1,6 @@
+from copy import copy
+
 from django import forms
-from django.conf import settings
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import user_passes_test
@@ -8,11 +9,11 @@ from django.urls import reverse_lazy
 from django.views import View
 from geopy import distance
 
+from foodcartapp.capabilities import capability_index
 from foodcartapp.models import Order, Product, Restaurant
+from geo_location.cache import geocode_cache
 from geo_location.models import GeoLocation
 
-from . import geo_coder
-
 
 class Login(forms.Form):
     username = forms.CharField(
@@ -100,75 +101,79 @@ def view_restaurants(request):
     })
 
 
-def location_from_address(locations, address)\
-            -> (bool, float | None, float | None):
+def get_locations(addresses):
+    """Return {address: (lon, lat)} of geocoded addresses.
+
+    Addresses never seen before are queued for geocoding.
+    """
+    locations = geocode_cache.get_many(addresses)
+    missing_addresses = set(addresses) - set(locations)
+    if missing_addresses:
+        GeoLocation.objects.enqueue(missing_addresses)
+    return locations
+
 
-    is_create = False
-    lon, lat = None, None
-    if address in locations.values_list('address', flat=True):
-        for location in locations:
-            if address == location.address:
-                lon = location.longitude
-                lat = location.latitude
-                break
-    else:
-        is_create = True
-        lon, lat = geo_coder.fetch_coordinates(
-                settings.YANDEX_GEOCODER_KEY,
-                address)
-        geo_location, created = GeoLocation.objects.get_or_create(
-            address=address, latitude=lat, longitude=lon)
+def has_coordinates(location):
+    return location is not None and None not in location
 
-    return is_create, lon, lat
+
+def get_distance(location, other_location):
+    (lon, lat), (other_lon, other_lat) = location, other_location
+    return round(distance.distance((lat, lon), (other_lat, other_lon)).km, 3)
 
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
 
-    orders = (
+    orders = list(
         Order.objects
         .with_amount()
         .exclude(status=Order.ChoicesStatus.COMPLETED)
         .order_by('-status', 'id')
+        .select_related('cook_restaurant')
         .prefetch_related('products')
-        )
+    )
 
-    location_adress = GeoLocation.objects.all()
+    orders_restaurant_ids = capability_index.match_many([
+        {order_item.product_id for order_item in order.products.all()}
+        for order in orders
+    ])
+    restaurants = Restaurant.objects.in_bulk({
+        restaurant_id
+        for restaurant_ids in orders_restaurant_ids
+        for restaurant_id in restaurant_ids
+    })
+    locations = get_locations(
+        [order.address for order in orders]
+        + [restaurant.address for restaurant in restaurants.values()]
+    )
 
-    for order in orders:
+    for order, restaurant_ids in zip(orders, orders_restaurant_ids):
         order.get_status = order.get_status_display()
 
-        created, lon_order_addres, lat_order_adress = location_from_address(
-            location_adress, order.address)
-
-        order.availability_geo = True
-        if lon_order_addres is None:
-            order.availability_geo = False
-
-        product_restaurants = []
-        order_product_restaurants = []
-        for order_item in order.products.all():
-            for restaurant_item in order_item.product\
-                                             .menu_items\
-                                             .filter(availability=True):
-
-                if order.availability_geo:
-                    created, lon, lat = location_from_address(
-                        location_adress, restaurant_item.restaurant.address)
-                    if created:
-                        location_adress = GeoLocation.objects.all()
-
-                    restaurant_item.restaurant.distance = round(
-                        distance.distance(
-                            (lon, lat),
-                            (lon_order_addres, lat_order_adress)).km, 3)
-
-                product_restaurants.append(restaurant_item.restaurant)
-
-            order_product_restaurants.append(set(product_restaurants))
-
-        order.access_restaurants = set\
-            .intersection(*[set(r) for r in order_product_restaurants])
+        order_location = locations.get(order.address)
+        order.location_pending = order.address not in locations
+        order.availability_geo = (
+            order.location_pending or has_coordinates(order_location))
+
+        order.access_restaurants = []
+        for restaurant_id in restaurant_ids:
+            if restaurant_id not in restaurants:
+                # Deleted after the capability index was read
+                continue
+            restaurant = copy(restaurants[restaurant_id])
+            restaurant_location = locations.get(restaurant.address)
+            restaurant.distance = None
+            if (
+                has_coordinates(order_location)
+                and has_coordinates(restaurant_location)
+            ):
+                restaurant.distance = get_distance(
+                    order_location, restaurant_location)
+            order.access_restaurants.append(restaurant)
+        order.access_restaurants.sort(
+            key=lambda restaurant: (
+                restaurant.distance is None, restaurant.distance or 0))
 
     return render(
         request,
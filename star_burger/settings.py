@@ -84,12 +84,57 @@ WSGI_APPLICATION = 'star_burger.wsgi.application'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+THUMBNAIL_SIZES = {
+    'small': (50, 50),
+    'medium': (200, 200),
+    'large': (600, 600),
+}
+
+IMAGE_VARIANT_WIDTHS = [320, 640, 960]
+IMAGE_VARIANT_FORMATS = ['avif', 'webp', 'jpeg']
+IMAGE_VARIANT_QUALITY = 80
+
 DATABASES = {
     'default': dj_database_url.config(
         default='sqlite:////{0}'.format(os.path.join(BASE_DIR, 'db.sqlite3'))
     )
 }
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    CACHES['default'].setdefault('OPTIONS', {})['MAX_ENTRIES'] = env.int(
+        'CACHE_MAX_ENTRIES', 10000)
+
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', 24 * 60 * 60)
+
+# Serve the hot API views with async implementations, for ASGI servers.
+API_ASYNC_VIEWS = env.bool('API_ASYNC_VIEWS', False)
+
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+
+ORDER_INTAKE_MODE = env('ORDER_INTAKE_MODE', 'direct')
+ORDER_VALIDATION_ENGINE = env('ORDER_VALIDATION_ENGINE', 'serializer')
+ORDER_JOURNAL_PATH = env(
+    'ORDER_JOURNAL_PATH',
+    os.path.join(BASE_DIR, 'order_journal.bin'),
+)
+
+# Coordinates of addresses kept in memory of each process.
+GEOCODE_CACHE_SIZE = env.int('GEOCODE_CACHE_SIZE', 10000)
+GEOCODE_CACHE_TTL = env.int('GEOCODE_CACHE_TTL', 24 * 60 * 60)
+
+# Addresses failed for network errors are retried after a doubling delay,
+# in seconds, and given up after the last attempt.
+GEOCODE_MAX_ATTEMPTS = env.int('GEOCODE_MAX_ATTEMPTS', 5)
+GEOCODE_RETRY_DELAY = env.int('GEOCODE_RETRY_DELAY', 60)
+
+# Concurrent order requests per process and token buckets of clients.
+ORDER_MAX_CONCURRENCY = env.int('ORDER_MAX_CONCURRENCY', 16)
+ORDER_THROTTLE_CLIENT_RATE = env('ORDER_THROTTLE_CLIENT_RATE', '60/min')
+ORDER_THROTTLE_PHONE_RATE = env('ORDER_THROTTLE_PHONE_RATE', '5/min')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',